@@ -0,0 +1,248 @@
+# ======================
+# MINDLY HTTP API
+# ======================
+# A dependency-free ASGI app exposing the chat engine over JSON so the
+# backend can run as its own horizontally scaled service:
+#
+#   uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+#
+# Workers keep no per-user state between requests: the client sends its
+# ChatSession (as returned by the previous call) with every request and gets
+# the updated one back, so any worker behind a load balancer can serve any
+# request. Persistent data goes through the configured repository backend.
+#
+# Endpoints (all JSON):
+#   GET  /health
+#   GET  /metrics  Prometheus text format (needs MINDLY_METRICS=1, see metrics.py)
+#   POST /chat     {"session": {...}?, "user": "...", "message": "..."} -> {"reply", "saved", "session"}
+#   POST /save     {"session": {...}}                                  -> {"saved", "session"}
+#   POST /profile  {"session": {...}}                                  -> {"traits", "summary"}
+#   POST /advice   {"session": {...}}                                  -> {"advice", "session"}
+#
+# MINDLY_API_TOKEN is required: every request except /health must carry
+# "Authorization: Bearer <token>", and the app refuses to start without it.
+# The token belongs to a trusted front end that has already logged the user
+# in. The API still only accepts existing users with safe names, rejects
+# malformed sessions with 400 before anything is stored, and takes a
+# conversation's saved traits from storage rather than from the session the
+# client sent.
+
+import asyncio
+import hmac
+import inspect
+import json
+import os
+from datetime import datetime
+
+import advice_refiner
+import chat_engine
+import chat_store
+import metrics
+import repository
+
+CONFIG_PATH = os.path.join("config", "users.yaml")
+API_TOKEN = os.environ.get("MINDLY_API_TOKEN")
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _is_count(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+def _check_session_data(data):
+    """Reject session fields the engine would choke on later, after a write"""
+    traits = data.get("traits", {})
+    if not isinstance(traits, dict) or not all(
+            trait in chat_engine.TRAITS and _is_count(value) for trait, value in traits.items()):
+        raise HTTPError(400, "traits must map known trait names to non-negative integers")
+    messages = data.get("messages", [])
+    if not isinstance(messages, list) or not all(
+            isinstance(m, dict) and isinstance(m.get("role"), str) and isinstance(m.get("content"), str)
+            for m in messages):
+        raise HTTPError(400, "messages must be objects with string role and content")
+    offset = data.get("message_offset", 0)
+    total = (offset if _is_count(offset) else 0) + len(messages)
+    for name in ("message_offset", "summary_upto", "saved_message_count"):
+        value = data.get(name, 0)
+        if not _is_count(value) or value > total:
+            raise HTTPError(400, f"{name} must be an integer between 0 and the message count")
+    # Messages before the offset exist only in storage, so they must be saved and summarized
+    if offset > min(data.get("saved_message_count", 0), data.get("summary_upto", 0)):
+        raise HTTPError(400, "message_offset is past the saved or summarized messages")
+
+def _session_from(body, repo):
+    data = body.get("session") or {}
+    if not isinstance(data, dict):
+        raise HTTPError(400, "session must be an object")
+    _check_session_data(data)
+    try:
+        session = chat_engine.ChatSession.from_dict(data)
+    except (TypeError, ValueError, KeyError, AttributeError):
+        raise HTTPError(400, "invalid session")
+    user = body.get("user") or session.user
+    if not user:
+        raise HTTPError(400, "user is required")
+    if session.user and user != session.user:
+        raise HTTPError(403, "session belongs to another user")
+    if not chat_store.is_safe_username(user) or not repo.user_exists(user):
+        raise HTTPError(403, "unknown user")
+    conversation_id = session.conversation_id
+    if not isinstance(conversation_id, str) or not 0 < len(conversation_id) <= 40:
+        raise HTTPError(400, "invalid conversation_id")
+    session.user = user
+    # Save bookkeeping the server can check comes from storage
+    session.saved_traits = repo.conversation_traits(user, conversation_id)
+    return session
+
+
+# ======================
+# HANDLERS
+# ======================
+# Blocking handlers run on a worker thread so slow calls never stall the
+# event loop. /chat is a coroutine: its LLM call waits on the shared async
+# pipeline, and only storage access goes to a thread.
+async def handle_chat(body):
+    repo = repository.get_repository(CONFIG_PATH)
+    session = await asyncio.to_thread(_session_from, body, repo)
+    message = body.get("message")
+    if not isinstance(message, str) or not message.strip():
+        raise HTTPError(400, "message is required")
+    errors = []
+    api_key = chat_engine.api_key_from_env()
+    reply = await chat_engine.chat_turn_async(session, message, api_key, errors.append)
+    saved = await asyncio.to_thread(_autosave_exchange, session, repo)
+    await asyncio.to_thread(chat_engine.refresh_summary, session, api_key)
+    return {"reply": reply, "saved": saved, "errors": errors, "session": session.to_dict()}
+
+def _autosave_exchange(session, repo):
+    """Autosave every exchange before responding. The write-behind queue isn't
+    used here: the client holds the session, and its next request may reach
+    a worker that never saw this one's queue."""
+    if not session.autosave_enabled or not chat_engine.save_chat_delta(session, repo, session.reactions):
+        return False
+    session.last_save_time = datetime.now()
+    return True
+
+def handle_save(body):
+    repo = repository.get_repository(CONFIG_PATH)
+    session = _session_from(body, repo)
+    saved = chat_engine.save_chat_delta(session, repo, session.reactions)
+    return {"saved": saved, "session": session.to_dict()}
+
+def handle_profile(body):
+    repo = repository.get_repository(CONFIG_PATH)
+    session = _session_from(body, repo)
+    total_traits = chat_engine.calculate_total_traits(session, repo)
+    summary = chat_engine.generate_profile_summary(total_traits, chat_engine.api_key_from_env())
+    return {"traits": total_traits, "summary": summary}
+
+def handle_advice(body):
+    session = _session_from(body, repository.get_repository(CONFIG_PATH))
+    pending = [a for a in session.advice_points if isinstance(a, dict) and not a.get("refined", True)]
+    for advice, text in advice_refiner.refine_concurrently(chat_engine.api_key_from_env(), pending):
+        advice["text"] = text
+        advice["refined"] = True
+    return {"advice": session.advice_points, "session": session.to_dict()}
+
+ROUTES = {
+    "/chat": handle_chat,
+    "/save": handle_save,
+    "/profile": handle_profile,
+    "/advice": handle_advice,
+}
+
+
+# ======================
+# ASGI PLUMBING
+# ======================
+async def _read_body(receive):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise HTTPError(413, "request body too large")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+async def _send_json(send, status, payload):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def _send_text(send, status, text, content_type):
+    body = text.encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+def _check_authorized(scope):
+    if not API_TOKEN:
+        raise HTTPError(503, "MINDLY_API_TOKEN is not set")
+    headers = dict(scope.get("headers") or [])
+    supplied = headers.get(b"authorization", b"")
+    if not hmac.compare_digest(supplied, f"Bearer {API_TOKEN}".encode("utf-8")):
+        raise HTTPError(401, "unauthorized")
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if not API_TOKEN:
+                    await send({"type": "lifespan.startup.failed", "message": "MINDLY_API_TOKEN must be set"})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    path, method = scope["path"].rstrip("/") or "/", scope["method"]
+    try:
+        if path == "/health":
+            await _send_json(send, 200, {"status": "ok"})
+            return
+        if path == "/metrics":
+            _check_authorized(scope)
+            if not metrics.ENABLED:
+                raise HTTPError(404, "metrics are disabled (set MINDLY_METRICS=1)")
+            await _send_text(send, 200, metrics.render(), b"text/plain; version=0.0.4; charset=utf-8")
+            return
+        if path not in ROUTES:
+            raise HTTPError(404, "not found")
+        if method != "POST":
+            raise HTTPError(405, "use POST")
+        _check_authorized(scope)
+        try:
+            body = json.loads(await _read_body(receive) or b"{}")
+        except ValueError:
+            raise HTTPError(400, "invalid JSON")
+        if not isinstance(body, dict):
+            raise HTTPError(400, "body must be a JSON object")
+        handler = ROUTES[path]
+        if inspect.iscoroutinefunction(handler):
+            result = await handler(body)
+        else:
+            result = await asyncio.to_thread(handler, body)
+        await _send_json(send, 200, result)
+    except HTTPError as e:
+        await _send_json(send, e.status, {"error": e.message})
+    except Exception as e:
+        await _send_json(send, 500, {"error": f"internal error: {e}"})
@@ -0,0 +1,278 @@
+# ======================
+# ASYNC LLM PIPELINE
+# ======================
+# Non-blocking front end for OpenRouter completions. One background event
+# loop per process owns a shared httpx.AsyncClient, so every chat session in
+# the process multiplexes its network I/O over that loop instead of pinning a
+# thread (and a pooled connection) for the whole request.
+#
+#   - At most MINDLY_LLM_MAX_IN_FLIGHT requests are on the wire at once
+#   - Up to MINDLY_LLM_MAX_QUEUED more wait their turn; beyond that submit()
+#     fails fast with QueueFull rather than piling up unbounded latency
+#   - Waiting requests are dispatched round-robin per user, so one user with
+#     a burst of calls cannot starve everyone else
+#
+# Callers on ordinary threads (the Streamlit script) use submit() / stream();
+# coroutines on another loop (api.py) await asyncio.wrap_future(submit(...)).
+# Retries, backoff and timeouts follow llm_client.
+
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import httpx
+
+import llm_client
+import metrics
+
+MAX_IN_FLIGHT = int(os.environ.get("MINDLY_LLM_MAX_IN_FLIGHT", "64"))
+MAX_QUEUED = int(os.environ.get("MINDLY_LLM_MAX_QUEUED", "1000"))
+
+_STREAM_END = object()
+
+
+class QueueFull(Exception):
+    """The pipeline already has MAX_QUEUED requests waiting"""
+
+
+class _Job:
+    __slots__ = ("user", "api_key", "payload", "endpoint", "on_token", "future", "queued_at")
+
+    def __init__(self, user, api_key, payload, endpoint, on_token, future):
+        self.user = user
+        self.api_key = api_key
+        self.payload = payload
+        self.endpoint = endpoint
+        self.on_token = on_token
+        self.future = future
+        self.queued_at = time.perf_counter()
+
+
+def _timeout(endpoint):
+    connect, read = llm_client.TIMEOUTS[endpoint]
+    return httpx.Timeout(read, connect=connect)
+
+
+class Pipeline:
+    """Bounded, per-user fair request scheduler on a private event loop"""
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, max_queued=MAX_QUEUED):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.loop = None
+        self.client = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._queues = {}       # user -> deque of waiting jobs
+        self._ready = deque()   # users with waiting jobs, in dispatch order
+        self._queued = 0
+        self._wakeup = None
+        self._slots = None
+        self._dispatcher = None
+        self.stats = {
+            "submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "cancelled": 0,
+            "in_flight": 0, "peak_in_flight": 0, "peak_queued": 0,
+        }
+
+    # ----- lifecycle -----
+    def start(self):
+        """Start the loop thread on first use; returns the loop"""
+        if self.loop is None:
+            with self._start_lock:
+                if self.loop is None:
+                    ready = threading.Event()
+                    self._thread = threading.Thread(target=self._run, args=(ready,),
+                                                    name="mindly-llm-loop", daemon=True)
+                    self._thread.start()
+                    ready.wait()
+        return self.loop
+
+    def _run(self, ready):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self.client = httpx.AsyncClient(limits=httpx.Limits(
+            max_connections=self.max_in_flight,
+            max_keepalive_connections=min(self.max_in_flight, llm_client.POOL_SIZE)
+        ))
+        self._dispatcher = loop.create_task(self._dispatch())
+        self.loop = loop
+        ready.set()
+        loop.run_forever()
+
+    def close(self):
+        """Close the shared client and stop the loop thread"""
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+        self.loop = None
+
+    async def _shutdown(self):
+        self._dispatcher.cancel()
+        await self.client.aclose()
+
+    # ----- scheduling (loop thread only) -----
+    def _enqueue(self, job):
+        if self._queued >= self.max_queued:
+            self.stats["rejected"] += 1
+            raise QueueFull(f"{self._queued} LLM requests already waiting")
+        waiting = self._queues.get(job.user)
+        if waiting is None:
+            waiting = self._queues[job.user] = deque()
+            self._ready.append(job.user)
+        waiting.append(job)
+        self._queued += 1
+        self.stats["submitted"] += 1
+        self.stats["peak_queued"] = max(self.stats["peak_queued"], self._queued)
+        self._wakeup.set()
+
+    def _next_job(self):
+        user = self._ready.popleft()
+        waiting = self._queues[user]
+        job = waiting.popleft()
+        if waiting:
+            self._ready.append(user)
+        else:
+            del self._queues[user]
+        self._queued -= 1
+        return job
+
+    async def _dispatch(self):
+        while True:
+            await self._slots.acquire()
+            while not self._ready:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            job = self._next_job()
+            if job.future.done():  # caller gave up while queued
+                self._slots.release()
+                continue
+            self.stats["in_flight"] += 1
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.stats["in_flight"])
+            task = asyncio.get_running_loop().create_task(self._execute(job))
+            # A caller that gives up mid-request (a closed stream, a dropped API
+            # client) cancels job.future; stop the request too so it doesn't
+            # hold its slot until the upstream finishes
+            job.future.add_done_callback(lambda f, task=task: task.cancel() if f.cancelled() else None)
+
+    async def _execute(self, job):
+        try:
+            result = await self._send(job)
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            raise
+        except Exception as e:
+            self.stats["failed"] += 1
+            metrics.llm_failed(job.endpoint, e)
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self.stats["completed"] += 1
+            metrics.llm_succeeded(job.endpoint, job.payload["messages"], result)
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self.stats["in_flight"] -= 1
+            self._slots.release()
+
+    # ----- HTTP -----
+    async def _send(self, job):
+        """POST one completion, retrying transient failures like llm_client does"""
+        for attempt in range(llm_client.MAX_RETRIES + 1):
+            last = attempt == llm_client.MAX_RETRIES
+            try:
+                request = self.client.build_request(
+                    "POST",
+                    llm_client.completions_url(),
+                    headers=llm_client.auth_headers(job.api_key),
+                    json=job.payload,
+                    timeout=_timeout(job.endpoint)
+                )
+                response = await self.client.send(request, stream=job.on_token is not None)
+            except httpx.TransportError:
+                if last:
+                    raise
+            else:
+                if response.status_code not in llm_client.RETRY_STATUSES or last:
+                    try:
+                        response.raise_for_status()
+                        if job.on_token is None:
+                            return response.json()['choices'][0]['message']['content'].strip()
+                        return await self._read_stream(response, job.on_token)
+                    finally:
+                        await response.aclose()
+                retry_after = response.headers.get("Retry-After")
+                await response.aclose()
+                if retry_after and retry_after.isdigit():
+                    await asyncio.sleep(min(llm_client.BACKOFF_CAP, int(retry_after)))
+                    continue
+            await asyncio.sleep(llm_client._backoff(attempt))
+
+    async def _read_stream(self, response, on_token):
+        decoder = llm_client.SSEDecoder()
+        parts = []
+        async for line in response.aiter_lines():
+            payload = decoder.feed(line)
+            if payload is None:
+                continue
+            deltas = llm_client.content_deltas(payload)
+            if deltas is None:
+                break
+            for token in deltas:
+                parts.append(token)
+                on_token(token)
+        return "".join(parts)
+
+    # ----- public API -----
+    async def complete(self, user, api_key, messages, model=llm_client.DEFAULT_MODEL,
+                       endpoint="chat", on_token=None, **params):
+        """Queue a completion and wait for it; must run on this pipeline's loop"""
+        payload = {"model": model, "messages": messages, **params}
+        if on_token is not None:
+            payload["stream"] = True
+        job = _Job(user, api_key, payload, endpoint, on_token, self.loop.create_future())
+        self._enqueue(job)
+        return await job.future
+
+    def submit(self, user, api_key, messages, **kwargs):
+        """Thread-safe: schedule complete() and return a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(
+            self.complete(user, api_key, messages, **kwargs), self.start()
+        )
+
+    def stream(self, user, api_key, messages, **kwargs):
+        """Blocking generator of text fragments for callers on ordinary threads.
+
+        Like llm_client.stream_chat_completion(), nothing is sent until the
+        generator is first advanced, and errors surface from the iteration.
+        """
+        tokens = queue.SimpleQueue()
+        future = self.submit(user, api_key, messages, on_token=tokens.put, **kwargs)
+        future.add_done_callback(lambda f: tokens.put(_STREAM_END))
+        try:
+            while (token := tokens.get()) is not _STREAM_END:
+                yield token
+            future.result()
+        finally:
+            future.cancel()
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def default_pipeline():
+    """Process-wide pipeline, created on first use"""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = Pipeline()
+    return _pipeline
@@ -0,0 +1,117 @@
+# ======================
+# AUTOSAVE BENCHMARK
+# ======================
+# Concurrent sessions (threads, as in the Streamlit server) each add
+# exchanges back to back and autosave after every one, against a data
+# directory of synthetic users. Compares:
+#
+#   interval     the old inline autosave: written on the reply path, at most
+#                every AUTOSAVE_INTERVAL_SECONDS (so mostly skipped)
+#   inline       written on the reply path after every exchange
+#   write-behind queued after every exchange, written by write_behind
+#
+# Reported: the time autosave adds to each reply (p50/p95/p99), how many
+# appends reached storage, and how many messages would have been lost by a
+# crash at the moment the last exchange finished.
+#
+#   python benchmarks/bench_autosave.py [--sessions 16] [--exchanges 50]
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import synthetic_data
+from bench_matcher import make_corpus
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class CountingRepo:
+    """Passes through to the real repository, counting appends"""
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.appends = 0
+        self.lock = threading.Lock()
+
+    def append_delta(self, *args, **kwargs):
+        with self.lock:
+            self.appends += 1
+        return self.repo.append_delta(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.repo, name)
+
+
+def run(mode, usernames, exchanges, corpus):
+    import chat_engine
+    import repository
+    import write_behind
+    repo = CountingRepo(repository.get_repository(os.path.join("config", "users.yaml")))
+    latencies, sessions = [], []
+    lock = threading.Lock()
+
+    def play(username, seed):
+        session = chat_engine.ChatSession(user=username)
+        times = []
+        for i in range(exchanges):
+            chat_engine.add_user_message(session, corpus[(seed + i) % len(corpus)])
+            chat_engine.add_assistant_reply(session, corpus[(seed + 2 * i + 1) % len(corpus)])
+            start = time.perf_counter()
+            if mode == "inline":
+                chat_engine.save_chat_delta(session, repo, session.reactions)
+            else:
+                chat_engine.autosave_chat(session, repo, background=(mode == "write-behind"))
+            times.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(times)
+            sessions.append(session)
+
+    threads = [threading.Thread(target=play, args=(u, i)) for i, u in enumerate(usernames)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    writer = write_behind.current_writer()
+    at_risk = 0
+    for s in sessions:
+        durable = s.saved_message_count
+        if mode == "write-behind":
+            durable = writer.durable_count(s.user, s.conversation_id, durable)
+        at_risk += len(s.messages) - durable
+    if writer is not None:
+        writer.drain()
+    return latencies, repo.appends, at_risk, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reply-path cost and durability of autosave")
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--exchanges", type=int, default=50, help="exchanges per session")
+    parser.add_argument("--chats", type=int, default=30, help="saved chats per synthetic user")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="mindly-autosave-")
+    os.environ.setdefault("MINDLY_DB_PATH", os.path.join(data_dir, "userdata", "mindly.db"))
+    usernames = synthetic_data.populate(data_dir, args.sessions, args.chats)
+    corpus = make_corpus(500)
+
+    print(f"{args.sessions} sessions x {args.exchanges} exchanges")
+    print(f"{'mode':<14}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}{'appends':>9}{'at risk':>9}{'wall s':>8}")
+    for mode in ("interval", "inline", "write-behind"):
+        latencies, appends, at_risk, elapsed = run(mode, usernames, args.exchanges, corpus)
+        print(f"{mode:<14}{statistics.median(latencies) * 1000:>8.2f}{percentile(latencies, 0.95) * 1000:>8.2f}"
+              f"{percentile(latencies, 0.99) * 1000:>8.2f}{appends:>9}{at_risk:>9}{elapsed:>8.2f}")
+    print("at risk: messages not yet in storage when the last exchange returned")
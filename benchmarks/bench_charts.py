@@ -0,0 +1,101 @@
+# ======================
+# TRAIT CHART BENCHMARK
+# ======================
+# Simulates repeated Profile page renders and compares the original pyplot
+# code (a new figure per rerun, never closed, handed to st.pyplot which saves
+# it as PNG) with trait_charts' renders, uncached and memoized. Reports
+# latency per render, then how much memory the process holds on to from a
+# separate, shorter tracemalloc run. Most reruns show the same trait vector;
+# --distinct controls how many different vectors cycle through (e.g. several
+# users on one server).
+#
+#   python benchmarks/bench_charts.py [--renders 200] [--distinct 5]
+
+import argparse
+import gc
+import io
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+plt.rcParams["figure.max_open_warning"] = 0  # leaking figures is what's being measured
+
+import trait_charts
+
+TRAITS = ["Empathy", "Self-Awareness", "Anxiety", "Optimism", "Mood Swings", "Confidence"]
+
+
+def legacy_render(total_traits):
+    """The Profile chart as it was; st.pyplot(fig) boils down to savefig(png)"""
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.barh(
+        [t for t in total_traits if total_traits[t] > 0],
+        [total_traits[t] for t in total_traits if total_traits[t] > 0],
+        color="#6eb5ff"
+    )
+    ax.set_xlabel("Cumulative Score")
+    ax.set_title("Your Emotional Traits Across All Chats")
+    ax.invert_yaxis()
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    return buf.getvalue()
+
+def cached_render(render):
+    def run(total_traits):
+        return render(
+            trait_charts.chart_key(total_traits, skip_zero=True),
+            "profile", "Your Emotional Traits Across All Chats", "Cumulative Score"
+        )
+    return run
+
+
+def profiles(distinct):
+    return [{t: (i + j) % 7 + 1 for j, t in enumerate(TRAITS)} for i in range(distinct)]
+
+def measure(name, fn, renders, memory_renders, distinct):
+    """Latency untraced, then retained/peak memory over a tracemalloc'd run"""
+    vectors = profiles(distinct)
+    latencies = []
+    for i in range(renders):
+        start = time.perf_counter()
+        fn(vectors[i % distinct])
+        latencies.append(time.perf_counter() - start)
+    figures = len(plt.get_fignums())
+
+    gc.collect()
+    tracemalloc.start()
+    for i in range(memory_renders):
+        fn(vectors[i % distinct])
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<14}{statistics.median(latencies) * 1000:>9.2f}{max(latencies) * 1000:>9.1f}"
+          f"{sum(latencies):>9.2f}{figures:>9}{retained / 2**20:>12.1f}{peak / 2**20:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark cached trait chart rendering")
+    parser.add_argument("--renders", type=int, default=200)
+    parser.add_argument("--memory-renders", type=int, default=30,
+                        help="renders traced for memory (tracemalloc slows matplotlib a lot)")
+    parser.add_argument("--distinct", type=int, default=5, help="different trait vectors")
+    args = parser.parse_args()
+
+    legacy_render(profiles(1)[0])  # warm up fonts and imports outside the measurements
+    plt.close("all")
+    print(f"{args.renders} Profile renders over {args.distinct} distinct trait vectors")
+    print(f"{'renderer':<14}{'p50 ms':>9}{'max ms':>9}{'total s':>9}{'figures':>9}{'retained MB':>12}{'peak MB':>10}")
+    measure("pyplot (old)", legacy_render, args.renders, args.memory_renders, args.distinct)
+    plt.close("all")
+    measure("figure api", cached_render(trait_charts.render_png.__wrapped__), args.renders, args.memory_renders, args.distinct)
+    measure("cached png", cached_render(trait_charts.render_png), args.renders, args.memory_renders, args.distinct)
+    measure("cached svg", cached_render(trait_charts.render_svg), args.renders, args.memory_renders, args.distinct)
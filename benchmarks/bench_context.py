@@ -0,0 +1,82 @@
+# ======================
+# CONTEXT WINDOW BENCHMARK
+# ======================
+# Plays a long synthetic conversation (with the occasional very long user
+# message) through chat_engine against the fake OpenRouter server and
+# compares the prompt sent for each reply:
+#
+#   last-4   the old prompt: the last four messages pasted into one string
+#   budget   context_window packing plus the rolling summary
+#
+# Sizes use context_window.estimate_tokens. Also reports how many summary
+# refreshes the budgeted builder needed and the reply latency per turn.
+#
+#   python benchmarks/bench_context.py [--turns 200] [--budget 1500]
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import fake_openrouter
+from bench_matcher import make_corpus
+
+LEGACY_PROMPT_OVERHEAD = 120  # the old THERAPIST_PROMPT text around {convo}
+
+
+def legacy_prompt_tokens(context_window, messages):
+    convo = "\n".join(f"{m['role']}: {m['content']}" for m in messages[-4:])
+    return LEGACY_PROMPT_OVERHEAD + context_window.estimate_tokens(convo)
+
+
+def user_messages(n, seed=11):
+    rng = random.Random(seed)
+    corpus = make_corpus(n, seed)
+    for text in corpus:
+        # Every so often someone pastes a diary entry
+        yield " ".join([text] * 40) if rng.random() < 0.05 else text
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare last-4 prompts with the token-budgeted builder")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=1500, help="MINDLY_CONTEXT_TOKENS")
+    args = parser.parse_args()
+
+    server, base_url = fake_openrouter.start_in_thread(latency=0.0)
+    os.environ["OPENROUTER_BASE_URL"] = base_url
+    os.environ["MINDLY_CONTEXT_TOKENS"] = str(args.budget)
+    os.environ["MINDLY_LLM_CACHE"] = "0"
+    import chat_engine
+    import context_window
+
+    session = chat_engine.ChatSession(user="bench")
+    legacy, budgeted, latencies = [], [], []
+    refreshes = 0
+    for text in user_messages(args.turns):
+        chat_engine.add_user_message(session, text)
+        legacy.append(legacy_prompt_tokens(context_window, session.messages))
+        convo = chat_engine.build_convo(session)
+        budgeted.append(sum(context_window.message_tokens(m) for m in convo))
+        start = time.perf_counter()
+        reply = chat_engine.get_response(session, convo, "bench")
+        latencies.append(time.perf_counter() - start)
+        chat_engine.add_assistant_reply(session, reply)
+        refreshes += chat_engine.refresh_summary(session, "bench")
+
+    def describe(sizes):
+        ordered = sorted(sizes)
+        return (f"mean {statistics.mean(sizes):7.0f}  p95 {ordered[int(0.95 * len(ordered))]:7d}"
+                f"  max {max(sizes):7d}")
+
+    print(f"{args.turns} turns, budget {args.budget} tokens")
+    print(f"last-4 prompt tokens : {describe(legacy)}")
+    print(f"budgeted prompt      : {describe(budgeted)}")
+    print(f"summary refreshes    : {refreshes} ({refreshes / args.turns:.2f} per turn), "
+          f"summary covers {session.summary_upto} of {len(session.messages)} messages")
+    print(f"reply latency        : p50 {statistics.median(latencies) * 1000:.1f} ms (fake server, no model time)")
+    server.shutdown()
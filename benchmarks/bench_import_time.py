@@ -0,0 +1,99 @@
+# ======================
+# IMPORT-TIME BENCHMARK
+# ======================
+# Measures what the unauthenticated login page of chatbottherapy.py costs in
+# module imports, using `python -X importtime` on a fresh interpreter that
+# runs the script through Streamlit's AppTest. Streamlit itself is imported
+# before the measurement starts, since the server pays for it once.
+#
+# Fails (exit 1) if the login page imports any of the page-specific heavy
+# dependencies (matplotlib, pycountry, passlib) or if its imports take longer
+# than --max-ms, so cold-start regressions show up in CI.
+#
+#   python benchmarks/bench_import_time.py [--repeat 3] [--max-ms 250]
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFERRED = ["matplotlib.pyplot", "pycountry", "passlib.hash"]
+MARK_APP = "### mindly-bench: app"
+MARK_DEFERRED = "### mindly-bench: deferred"
+
+CHILD = f"""
+import sys
+sys.path.insert(0, {ROOT!r})
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({os.path.join(ROOT, "chatbottherapy.py")!r}, default_timeout=60)
+print({MARK_APP!r}, file=sys.stderr, flush=True)
+app.run()
+if app.exception:
+    raise SystemExit(f"login page failed: {{app.exception}}")
+loaded = [m for m in {DEFERRED!r} if m in sys.modules]
+print({MARK_DEFERRED!r}, ",".join(loaded), file=sys.stderr, flush=True)
+for name in {DEFERRED!r}:
+    __import__(name)
+"""
+
+
+def top_level_imports(lines):
+    """(name, cumulative_us) for each import not nested under another one"""
+    result = []
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if name.startswith(" ") and not name.startswith("  "):
+            try:
+                result.append((name.strip(), int(cumulative)))
+            except ValueError:
+                continue  # header row
+    return result
+
+
+def measure():
+    """One cold run; returns (app_imports, leaked, deferred_imports)"""
+    with tempfile.TemporaryDirectory() as workdir:  # the app creates config/ and userdata/
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", CHILD],
+            cwd=workdir, capture_output=True, text=True
+        )
+    if proc.returncode:
+        sys.exit(proc.stderr[-2000:])
+    lines = proc.stderr.splitlines()
+    app_start = next(i for i, l in enumerate(lines) if l.startswith(MARK_APP))
+    deferred_start = next(i for i, l in enumerate(lines) if l.startswith(MARK_DEFERRED))
+    leaked = [m for m in lines[deferred_start][len(MARK_DEFERRED):].strip().split(",") if m]
+    return (top_level_imports(lines[app_start:deferred_start]), leaked,
+            top_level_imports(lines[deferred_start + 1:]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time budget for the login page")
+    parser.add_argument("--repeat", type=int, default=3, help="cold runs; the fastest is reported")
+    parser.add_argument("--max-ms", type=float, default=250.0, help="fail above this many ms of imports")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.repeat)]
+    app_imports, leaked, deferred = min(runs, key=lambda r: sum(us for _, us in r[0]))
+    total_ms = sum(us for _, us in app_imports) / 1000
+
+    print(f"login page imports: {total_ms:.1f} ms (best of {args.repeat}, budget {args.max_ms:.0f} ms)")
+    for name, us in sorted(app_imports, key=lambda x: -x[1])[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+    print("deferred to the pages that need them:")
+    for name, us in deferred:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if leaked:
+        print(f"REGRESSION: login page imported {', '.join(leaked)}")
+        failed = True
+    if total_ms > args.max_ms:
+        print(f"REGRESSION: {total_ms:.1f} ms exceeds the {args.max_ms:.0f} ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,111 @@
+# ======================
+# LOGIN BURST BENCHMARK
+# ======================
+# Fires --burst concurrent login attempts (one thread each, like Streamlit
+# script threads) while a few signed-in sessions keep scoring chat messages,
+# and compares:
+#
+#   inline  passlib verify on the calling thread (the old login page)
+#   pool    passwords.verify_password: niced worker processes, bounded queue
+#
+# Reports login throughput and latency, and the latency of the chat work
+# running alongside against a quiet baseline.
+#
+#   python benchmarks/bench_login.py [--burst 32] [--rounds 29000] [--workers 2]
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_matcher import make_corpus
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def chat_load(stop, latencies, messages):
+    """A signed-in session: score messages back to back, timing each"""
+    from trait_matcher import default_matcher
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        default_matcher.scan(messages[i % len(messages)])
+        latencies.append(time.perf_counter() - start)
+        i += 1
+        time.sleep(0.005)
+
+def run(name, verify, burst, sessions, messages):
+    stop = threading.Event()
+    chat_latencies = []
+    chatters = [threading.Thread(target=chat_load, args=(stop, chat_latencies, messages))
+                for _ in range(sessions)]
+    for t in chatters:
+        t.start()
+    login_latencies = []
+
+    def login():
+        start = time.perf_counter()
+        verify()
+        login_latencies.append(time.perf_counter() - start)
+
+    time.sleep(0.2)
+    start = time.perf_counter()
+    if burst:
+        logins = [threading.Thread(target=login) for _ in range(burst)]
+        for t in logins:
+            t.start()
+        for t in logins:
+            t.join()
+    else:
+        time.sleep(1.0)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for t in chatters:
+        t.join()
+    if burst:
+        login = (f"{burst / elapsed:>9.1f}{statistics.median(login_latencies) * 1000:>10.0f}"
+                 f"{percentile(login_latencies, 0.95) * 1000:>10.0f}")
+    else:
+        login = f"{'-':>9}{'-':>10}{'-':>10}"
+    print(f"{name:<10}{login}{statistics.median(chat_latencies) * 1000:>10.2f}"
+          f"{percentile(chat_latencies, 0.95) * 1000:>10.2f}{percentile(chat_latencies, 0.99) * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Login throughput and chat latency during a login burst")
+    parser.add_argument("--burst", type=int, default=32, help="concurrent login attempts")
+    parser.add_argument("--sessions", type=int, default=4, help="signed-in sessions chatting meanwhile")
+    parser.add_argument("--rounds", type=int, default=29000, help="MINDLY_HASH_ROUNDS")
+    parser.add_argument("--workers", type=int, default=2, help="MINDLY_HASH_WORKERS")
+    args = parser.parse_args()
+
+    os.environ["MINDLY_HASH_ROUNDS"] = str(args.rounds)
+    os.environ["MINDLY_HASH_WORKERS"] = str(args.workers)
+    os.environ["MINDLY_HASH_MAX_PENDING"] = str(max(args.burst, 1))
+    os.environ["MINDLY_HASH_WAIT"] = "600"
+    import passwords
+    from passlib.hash import pbkdf2_sha256
+
+    stored = passwords.hash_password("correct horse")  # also starts the pool
+    for _ in range(args.workers):
+        passwords.verify_password("correct horse", stored)
+    inline = pbkdf2_sha256.using(rounds=args.rounds)
+    corpus = make_corpus(400, 5)
+    # A chat turn's worth of scoring: about a millisecond of pure-Python work
+    messages = [" ".join(corpus[i:i + 40]) for i in range(0, len(corpus), 40)]
+
+    print(f"{args.burst} concurrent logins at {args.rounds} rounds, {args.sessions} sessions chatting, "
+          f"{os.cpu_count()} CPUs, {args.workers} hash workers")
+    print(f"{'mode':<10}{'logins/s':>9}{'login p50':>10}{'login p95':>10}"
+          f"{'chat p50':>10}{'chat p95':>10}{'chat p99':>10}   (ms)")
+    run("quiet", None, 0, args.sessions, messages)
+    run("inline", lambda: inline.verify("correct horse", stored), args.burst, args.sessions, messages)
+    run("pool", lambda: passwords.verify_password("correct horse", stored), args.burst, args.sessions, messages)
+    passwords.shutdown()
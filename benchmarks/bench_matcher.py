@@ -0,0 +1,116 @@
+# ======================
+# MATCHER MICRO-BENCHMARK
+# ======================
+# Compares trait_matcher.Matcher against the original per-keyword
+# update_traits()/extract_advice() loops on a synthetic corpus of replies,
+# checking that both produce identical results before timing them. The
+# equivalence check also runs on a lexicon whose keywords share prefixes
+# ("feel" / "feel for"), which the default lexicon happens to avoid.
+#
+#   python benchmarks/bench_matcher.py [--replies 20000] [--repeat 3]
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from trait_matcher import ADVICE_PHRASES, TRAIT_PATTERNS, Matcher
+
+
+# Keywords that are prefixes of other keywords, within and across traits
+PREFIX_PATTERNS = {
+    "Empathy": ["feel", "feel for", "feel for you", "understand"],
+    "Confidence": ["strong", "you can"],
+    "Mood Swings": ["strong feelings", "feel"],
+    "Optimism": ["hope", "hope so"],
+}
+PREFIX_PHRASES = ["try", "try to", "you might", "might help"]
+
+
+def legacy_update_traits(text, patterns=TRAIT_PATTERNS):
+    """update_traits() as it was, minus st.session_state"""
+    traits = {t: 0 for t in patterns}
+    for trait, keywords in patterns.items():
+        for kw in keywords:
+            if re.search(rf"\b{kw}\b", text, re.IGNORECASE):
+                traits[trait] += 1
+    return {t: v for t, v in traits.items() if v}
+
+def legacy_extract_advice(response, phrases=ADVICE_PHRASES):
+    """extract_advice() as it was, returning sentences instead of storing them"""
+    sentences = [s.strip() for s in re.split(r'(?<=[.!?]) +', response)]
+    return [s for s in sentences if any(phrase in s.lower() for phrase in phrases)]
+
+
+FILLER = (
+    "that is a lot to carry right now. how long have you felt this way? "
+    "it makes sense to feel tired after a week like that. what helps you unwind? "
+    "i hear that your family matters a great deal to you. "
+    "sometimes things change slowly and that is okay. you are not alone in this. "
+    "tell me more about the country you grew up in. the pastry shop sounds lovely."
+).split(". ")
+
+def make_corpus(n, seed=7, patterns=TRAIT_PATTERNS, phrases=ADVICE_PHRASES):
+    rng = random.Random(seed)
+    keywords = [kw for kws in patterns.values() for kw in kws] + phrases
+    replies = []
+    for _ in range(n):
+        parts = []
+        for _ in range(rng.randint(2, 5)):
+            sentence = rng.choice(FILLER).strip().rstrip(".")
+            if rng.random() < 0.6:
+                word = rng.choice(keywords)
+                word = word.upper() if rng.random() < 0.1 else word
+                sentence = f"{sentence} and {word} {rng.choice(['today', 'more', 'it'])}"
+            parts.append(sentence.capitalize() + rng.choice([".", "!", "?"]))
+        replies.append(" ".join(parts) + " 🌱")
+    return replies
+
+
+def count_mismatches(corpus, patterns, phrases):
+    matcher = Matcher(patterns, phrases)
+    mismatches = 0
+    for text in corpus:
+        traits, advice = matcher.scan(text)
+        if traits != legacy_update_traits(text, patterns) or advice != legacy_extract_advice(text, phrases):
+            mismatches += 1
+    return mismatches
+
+
+def time_it(fn, corpus, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in corpus:
+            fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the compiled trait/advice matcher")
+    parser.add_argument("--replies", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.replies)
+    matcher = Matcher()
+
+    mismatches = 0
+    for label, patterns, phrases in (("default lexicon", TRAIT_PATTERNS, ADVICE_PHRASES),
+                                     ("shared prefixes", PREFIX_PATTERNS, PREFIX_PHRASES)):
+        texts = corpus if patterns is TRAIT_PATTERNS else make_corpus(args.replies, 11, patterns, phrases)
+        failed = count_mismatches(texts, patterns, phrases)
+        print(f"equivalence ({label}): {len(texts) - failed}/{len(texts)} replies identical")
+        mismatches += failed
+
+    legacy = time_it(lambda t: (legacy_update_traits(t), legacy_extract_advice(t)), corpus, args.repeat)
+    compiled = time_it(matcher.scan, corpus, args.repeat)
+    print(f"legacy loops : {legacy * 1e6 / len(corpus):8.1f} us/reply  ({legacy:.3f}s total)")
+    print(f"compiled scan: {compiled * 1e6 / len(corpus):8.1f} us/reply  ({compiled:.3f}s total)")
+    print(f"speedup      : {legacy / compiled:.1f}x")
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,68 @@
+# ======================
+# INSTRUMENTATION OVERHEAD BENCHMARK
+# ======================
+# What metrics.py adds per instrumented call, with MINDLY_METRICS off (the
+# default) and on: a function decorated with metrics.timed(), a
+# metrics.span() block and a metrics.count() call, each compared with the
+# bare operation.
+#
+#   python benchmarks/bench_metrics.py [--calls 200000]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import metrics
+
+
+def work(x):
+    return x + 1
+
+def per_call_ns(fn, calls):
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter_ns()
+        fn(calls)
+        best = min(best, time.perf_counter_ns() - start)
+    return best / calls
+
+def bare(calls):
+    for i in range(calls):
+        work(i)
+
+def make_decorated():
+    decorated = metrics.timed("bench")(work)
+
+    def run(calls):
+        for i in range(calls):
+            decorated(i)
+    return run
+
+def with_span(calls):
+    for i in range(calls):
+        with metrics.span("bench"):
+            work(i)
+
+def with_count(calls):
+    for i in range(calls):
+        work(i)
+        metrics.count("bench", endpoint="chat")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-call cost of metrics.py")
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+    metrics.STATS_FILE = None
+
+    baseline = per_call_ns(bare, args.calls)
+    print(f"bare call: {baseline:.0f} ns")
+    print(f"{'':<10}{'timed()':>14}{'span()':>14}{'count()':>14}   (ns added per call)")
+    for enabled in (False, True):
+        metrics.ENABLED = enabled
+        metrics.reset()
+        added = [per_call_ns(fn, args.calls) - baseline for fn in (make_decorated(), with_span, with_count)]
+        print(f"{'on' if enabled else 'off':<10}" + "".join(f"{ns:>14.0f}" for ns in added))
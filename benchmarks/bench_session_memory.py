@@ -0,0 +1,98 @@
+# ======================
+# SESSION MEMORY BENCHMARK
+# ======================
+# Builds chat sessions of increasing length and reports the memory each one
+# holds on to (tracemalloc, after gc) for three transcript models:
+#
+#   dicts    the old list of {"role", "content"} dicts, all kept in memory
+#   slots    MessageBuffer records (two slots, interned role), nothing spilled
+#   spilled  MessageBuffer with autosave after every exchange and the rolling
+#            summary keeping up, so older turns are dropped from memory
+#
+# Summaries are simulated (summary_upto advanced as a successful refresh
+# would), so no LLM server is needed; saves go to a temporary file store.
+#
+#   python benchmarks/bench_session_memory.py [--turns 50,500,2000] [--sessions 20]
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_matcher import make_corpus
+
+import chat_engine
+import chat_store
+import repository
+from message_buffer import MessageBuffer
+
+
+def texts(turns, seed):
+    rng = random.Random(seed)
+    corpus = make_corpus(200, seed)
+    # Fresh string objects, as if they had just arrived from the browser or the API
+    return [(rng.choice(corpus) + " ")[:-1] for _ in range(2 * turns)]
+
+def build_dicts(turns, seed, repo):
+    messages = [{"role": "assistant", "content": chat_engine.GREETING}]
+    for i, text in enumerate(texts(turns, seed)):
+        messages.append({"role": "user" if i % 2 == 0 else "assistant", "content": text})
+    return messages
+
+def build_slots(turns, seed, repo):
+    messages = MessageBuffer([{"role": "assistant", "content": chat_engine.GREETING}])
+    for i, text in enumerate(texts(turns, seed)):
+        messages.append({"role": "user" if i % 2 == 0 else "assistant", "content": text})
+    return messages
+
+def build_spilled(turns, seed, repo):
+    session = chat_engine.ChatSession(user=f"bench{seed}")
+    words = texts(turns, seed)
+    for i in range(0, len(words), 2):
+        chat_engine.add_user_message(session, words[i])
+        chat_engine.add_assistant_reply(session, words[i + 1])
+        start, _ = chat_engine._window(session)
+        if start - session.summary_upto >= chat_engine.SUMMARY_REFRESH_MESSAGES:
+            session.summary_upto = start
+        chat_engine.save_chat_delta(session, repo)
+    return session.messages
+
+def retained(build, turns, sessions, repo):
+    """Bytes held per session, averaged over sessions built back to back"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(turns, seed, repo) for seed in range(sessions)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    in_memory = sum(len(m) - getattr(m, "offset", 0) for m in kept) // sessions
+    return (after - before) / sessions, in_memory
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-session transcript memory")
+    parser.add_argument("--turns", default="50,500,2000", help="exchanges per session")
+    parser.add_argument("--sessions", type=int, default=20, help="sessions per measurement")
+    args = parser.parse_args()
+
+    chat_store.USERDATA_DIR = tempfile.mkdtemp(prefix="mindly-mem-")
+    os.environ["MINDLY_SEARCH_PATH"] = os.path.join(chat_store.USERDATA_DIR, "search.db")
+    import search_index
+    search_index.INDEX_PATH = os.environ["MINDLY_SEARCH_PATH"]
+    repo = repository.FileRepository(os.path.join(chat_store.USERDATA_DIR, "users.yaml"))
+
+    print(f"context budget {os.environ.get('MINDLY_CONTEXT_TOKENS', '1500')} tokens, "
+          f"window {chat_engine.SESSION_WINDOW} messages, {args.sessions} sessions each")
+    print(f"{'turns':>6}{'model':>9}{'KB/session':>12}{'in memory':>11}{'vs dicts':>10}")
+    for turns in [int(t) for t in args.turns.split(",")]:
+        baseline = None
+        for name, build in (("dicts", build_dicts), ("slots", build_slots), ("spilled", build_spilled)):
+            size, in_memory = retained(build, turns, args.sessions, repo)
+            baseline = baseline or size
+            print(f"{turns:>6}{name:>9}{size / 1024:>12.1f}{in_memory:>11}{size / baseline:>10.2f}")
@@ -0,0 +1,132 @@
+# ======================
+# FAKE OPENROUTER SERVER
+# ======================
+# A stdlib-only stand-in for the OpenRouter chat completions endpoint, used to
+# exercise llm_client and the app without network access or API spend.
+# Supports both plain JSON replies and "stream": true server-sent events.
+#
+#   python benchmarks/fake_openrouter.py --port 8765 --latency 0.3 --token-delay 0.02
+#   OPENROUTER_BASE_URL=http://127.0.0.1:8765/api/v1 streamlit run chatbottherapy.py
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = (
+    "That sounds really hard, and I understand why you feel that way. "
+    "You might try writing down what worries you before bed. "
+    "What do you think has been weighing on you most? 🌱"
+)
+
+
+class FakeOpenRouterHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _settings(self):
+        """Settings dict attached to the server by make_server()"""
+        return self.server.settings
+
+    def log_message(self, format, *args):
+        if self._settings()["verbose"]:
+            super().log_message(format, *args)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        settings = self._settings()
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        with self.server.stats_lock:
+            self.server.stats["requests"] += 1
+
+        if settings["fail_every"] and self.server.stats["requests"] % settings["fail_every"] == 0:
+            self.send_error(503, "Simulated upstream failure")
+            return
+
+        time.sleep(settings["latency"])
+        reply = settings["reply_fn"](body) if settings["reply_fn"] else settings["reply"]
+
+        if body.get("stream"):
+            self._stream(reply, settings["token_delay"])
+        else:
+            payload = json.dumps({
+                "id": "fake-completion",
+                "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(reply.split())}
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    def _stream(self, reply, token_delay):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        self.wfile.write(b": OPENROUTER PROCESSING\n\n")
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            token = word if i == 0 else " " + word
+            chunk = {"choices": [{"index": 0, "delta": {"content": token}}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class FakeServer(ThreadingHTTPServer):
+    # The stdlib default backlog of 5 drops connection bursts from load tests
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def make_server(host="127.0.0.1", port=0, latency=0.0, token_delay=0.0,
+                reply=DEFAULT_REPLY, reply_fn=None, fail_every=0, verbose=False):
+    """Create (but don't start) a fake server. port=0 picks a free port."""
+    server = FakeServer((host, port), FakeOpenRouterHandler)
+    server.settings = {
+        "latency": latency,
+        "token_delay": token_delay,
+        "reply": reply,
+        "reply_fn": reply_fn,
+        "fail_every": fail_every,
+        "verbose": verbose,
+    }
+    server.stats = {"requests": 0}
+    server.stats_lock = threading.Lock()
+    return server
+
+def start_in_thread(**kwargs):
+    """Start a fake server on a background thread; returns (server, base_url)"""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/api/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local fake OpenRouter endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first byte")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between streamed tokens")
+    parser.add_argument("--fail-every", type=int, default=0, help="return 503 on every Nth request")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.token_delay,
+                         fail_every=args.fail_every, verbose=args.verbose)
+    print(f"Fake OpenRouter listening on http://{args.host}:{args.port}/api/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,314 @@
+# ======================
+# APP LOAD TEST
+# ======================
+# Drives chatbottherapy.py headlessly through Streamlit's AppTest against the
+# fake OpenRouter server and a data directory of synthetic users
+# (synthetic_data.py), one scenario at a time:
+#
+#   login    submit the login form (password verification, rate limiting)
+#   chat     send messages on the Chat page (streamed reply, rolling summary,
+#            autosave)
+#   save     add an exchange and press "Save Current Chat" (delta save,
+#            search indexing)
+#   profile  open Personal Insights (trait totals, profile summary, chart)
+#   saved    open Saved Chats and pick a chat (paging, transcript, chart)
+#   advice   open Advice Collection with unpolished tips (concurrent refining)
+#
+# Each measurement is one script run as the user would trigger it. AppTest
+# runs one session per process at a time, so --workers processes play
+# sessions side by side, sharing the data directory and the fake server.
+# Reported per scenario: p50/p95/p99 latency, runs per second across all
+# workers, and the workers' peak RSS and growth per session.
+#
+# Results are compared with a stored baseline (same settings only) and the
+# run fails (exit 1) when p95 or throughput regress by more than
+# --tolerance. --save-baseline records the current numbers instead.
+#
+#   python benchmarks/load_app.py [--scenarios login,chat,...] [--sessions 8] [--workers 2]
+#   python benchmarks/load_app.py --save-baseline
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import fake_openrouter
+import synthetic_data
+
+APP = os.path.join(ROOT, "chatbottherapy.py")
+SCENARIOS = ["login", "chat", "save", "profile", "saved", "advice"]
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline_load_app.json")
+# Settings that change the numbers; a baseline only applies when they match
+COMPARABLE = ["users", "chats", "messages", "sessions", "turns", "workers", "latency", "token_delay"]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def rss_kb():
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def peak_rss_kb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+# ======================
+# SCENARIOS
+# ======================
+# Each takes a fresh AppTest and returns the seconds of every measured run.
+def signed_in(at, username, page="Chat"):
+    import chat_engine
+    at.session_state["user"] = username
+    at.session_state["auth_status"] = True
+    at.session_state["page"] = page
+    at.session_state["chat_session"] = chat_engine.ChatSession(user=username)
+    return at
+
+def timed(at):
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return elapsed
+
+def run_login(at, username, rng, turns, corpus):
+    at.run()
+    times = []
+    for _ in range(turns):
+        at.text_input[0].set_value(username)
+        at.text_input[1].set_value(synthetic_data.password_for(username))
+        at.button[0].click()
+        times.append(timed(at))
+        if at.session_state["user"] != username:
+            raise RuntimeError(f"login failed for {username}")
+        at.session_state["user"] = None
+        at.session_state["auth_status"] = None
+        at.run()
+    return times
+
+def run_chat(at, username, rng, turns, corpus):
+    signed_in(at, username).run()
+    times = []
+    for _ in range(turns):
+        at.chat_input[0].set_value(rng.choice(corpus))
+        times.append(timed(at))
+    return times
+
+def run_save(at, username, rng, turns, corpus):
+    import chat_engine
+    signed_in(at, username).run()
+    session = at.session_state["chat_session"]
+    times = []
+    for _ in range(turns):
+        chat_engine.add_user_message(session, rng.choice(corpus))
+        chat_engine.add_assistant_reply(session, rng.choice(corpus))
+        at.button(key="save_chat_btn").click()
+        times.append(timed(at))
+    return times
+
+def run_page(page):
+    def run(at, username, rng, turns, corpus):
+        signed_in(at, username, page)
+        return [timed(at) for _ in range(turns)]
+    return run
+
+def run_saved(at, username, rng, turns, corpus):
+    signed_in(at, username, "Saved").run()
+    times = []
+    for _ in range(turns):
+        at.selectbox[0].set_value(rng.randrange(len(at.selectbox[0].options)))
+        times.append(timed(at))
+    return times
+
+def run_advice(at, username, rng, turns, corpus):
+    from datetime import datetime
+    from trait_matcher import default_matcher
+    tips = [s for text in corpus for s in default_matcher.advice_sentences(text)]
+    signed_in(at, username, "Advice")
+    session = at.session_state["chat_session"]
+    times = []
+    for _ in range(turns):
+        session.advice_points[:] = [
+            {"text": tip, "timestamp": datetime.now().isoformat(), "refined": False}
+            for tip in rng.sample(tips, 5)
+        ]
+        times.append(timed(at))
+    return times
+
+RUNNERS = {
+    "login": run_login,
+    "chat": run_chat,
+    "save": run_save,
+    "profile": run_page("Profile"),
+    "saved": run_saved,
+    "advice": run_advice,
+}
+
+
+# ======================
+# WORKERS
+# ======================
+def worker(scenario, usernames, turns, seed, results):
+    """Play sessions for usernames one after another; runs in its own process"""
+    from streamlit.testing.v1 import AppTest
+    from bench_matcher import make_corpus
+    # Setting session_state from outside a script run logs a bare-mode warning each time
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").disabled = True
+    corpus = make_corpus(200, seed)
+    rng = random.Random(seed)
+
+    # One unmeasured session first: page imports and first-render caches are
+    # cold-start costs (bench_import_time.py), not per-session ones
+    RUNNERS[scenario](AppTest.from_file(APP, default_timeout=60), usernames[0], rng, 1, corpus)
+    rss_before = rss_kb()
+    times, errors = [], []
+    started = time.time()
+    for username in usernames:
+        try:
+            times.extend(RUNNERS[scenario](AppTest.from_file(APP, default_timeout=60),
+                                           username, rng, turns, corpus))
+        except Exception as e:
+            errors.append(f"{username}: {e}")
+    results.put({
+        "times": times,
+        "errors": errors,
+        "started": started,
+        "finished": time.time(),
+        "sessions": len(usernames),
+        "rss_growth_kb": rss_kb() - rss_before,
+        "peak_rss_kb": peak_rss_kb(),
+    })
+
+def run_scenario(scenario, usernames, sessions, turns, workers, seed):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    players = [usernames[i % len(usernames)] for i in range(sessions)]
+    procs = [ctx.Process(target=worker, args=(scenario, players[w::workers], turns, seed + w, results))
+             for w in range(workers)]
+    for proc in procs:
+        proc.start()
+    parts = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+
+    times = [t for p in parts for t in p["times"]]
+    elapsed = max(p["finished"] for p in parts) - min(p["started"] for p in parts)
+    return {
+        "runs": len(times),
+        "p50": statistics.median(times) if times else None,
+        "p95": percentile(times, 0.95) if times else None,
+        "p99": percentile(times, 0.99) if times else None,
+        "throughput": len(times) / elapsed if elapsed > 0 else None,
+        "peak_rss_mb": max(p["peak_rss_kb"] for p in parts) / 1024,
+        "kb_per_session": sum(p["rss_growth_kb"] for p in parts) / max(1, sessions),
+        "errors": [e for p in parts for e in p["errors"]],
+    }
+
+
+# ======================
+# BASELINE
+# ======================
+def compare(results, baseline, tolerance):
+    """Regression messages for results against a baseline with the same settings"""
+    problems = []
+    for name, now in results.items():
+        before = baseline["scenarios"].get(name)
+        if not before or now["p95"] is None:
+            continue
+        if now["p95"] > before["p95"] * (1 + tolerance):
+            problems.append(f"{name}: p95 {now['p95'] * 1000:.0f} ms vs {before['p95'] * 1000:.0f} ms baseline")
+        if now["throughput"] < before["throughput"] / (1 + tolerance):
+            problems.append(f"{name}: {now['throughput']:.1f} runs/s vs {before['throughput']:.1f} baseline")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the Streamlit app against the fake OpenRouter server")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--chats", type=int, default=30, help="average saved chats per user")
+    parser.add_argument("--messages", type=int, default=24, help="average messages per saved chat")
+    parser.add_argument("--sessions", type=int, default=8, help="sessions per scenario")
+    parser.add_argument("--turns", type=int, default=5, help="measured runs per session")
+    parser.add_argument("--workers", type=int, default=2, help="processes playing sessions at once")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake server seconds before the first byte")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="fake server seconds between tokens")
+    parser.add_argument("--data-dir", help="reuse (or create) this data directory instead of a temporary one")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="record this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before failing")
+    args = parser.parse_args()
+    settings = {k: getattr(args, k) for k in COMPARABLE}
+
+    server, base_url = fake_openrouter.start_in_thread(latency=args.latency, token_delay=args.token_delay)
+    # Inherited by the worker processes. Every request reaches the fake server
+    # (no reply cache, no retries) and login rate limiting stays out of the way.
+    os.environ.update({
+        "OPENROUTER_BASE_URL": base_url,
+        "OPENROUTER_API_KEY": "bench",
+        "MINDLY_LLM_CACHE": "0",
+        "MINDLY_HTTP_RETRIES": "0",
+        "MINDLY_LOGIN_ATTEMPTS": str(10 ** 6),
+    })
+    data_dir = os.path.abspath(args.data_dir or tempfile.mkdtemp(prefix="mindly-load-"))
+    usernames = synthetic_data.populate(data_dir, args.users, args.chats, args.messages, args.seed)
+
+    print(f"fake server at {base_url}, latency {args.latency}s, {args.sessions} sessions x "
+          f"{args.turns} runs per scenario on {args.workers} workers")
+    print(f"{'scenario':<9}{'runs':>6}{'runs/s':>8}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}"
+          f"{'peak MB':>9}{'KB/sess':>9}{'errors':>8}")
+    results = {}
+    for scenario in args.scenarios.split(","):
+        r = results[scenario] = run_scenario(scenario, usernames, args.sessions, args.turns,
+                                             args.workers, args.seed)
+        ms = lambda v: f"{v * 1000:.0f}" if v is not None else "-"
+        print(f"{scenario:<9}{r['runs']:>6}{r['throughput'] or 0:>8.1f}{ms(r['p50']):>8}{ms(r['p95']):>8}"
+              f"{ms(r['p99']):>8}{r['peak_rss_mb']:>9.0f}{r['kb_per_session']:>9.0f}{len(r['errors']):>8}")
+        for error in r["errors"][:3]:
+            print("  " + error)
+    server.shutdown()
+
+    failed = any(r["errors"] for r in results.values())
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "settings": settings,
+                "machine": {"python": platform.python_version(), "cpus": os.cpu_count()},
+                "scenarios": {name: {k: round(v, 4) for k, v in r.items() if k != "errors"}
+                              for name, r in results.items()},
+            }, f, indent=2)
+            f.write("\n")
+        print(f"baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["settings"] != settings:
+            print(f"baseline {args.baseline} was recorded with other settings; not compared")
+        else:
+            problems = compare(results, baseline, args.tolerance)
+            for problem in problems:
+                print(f"REGRESSION: {problem}")
+            print(f"compared with {args.baseline}: {'OK' if not problems else f'{len(problems)} regressions'}")
+            failed = failed or bool(problems)
+    sys.exit(1 if failed else 0)
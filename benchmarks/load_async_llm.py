@@ -0,0 +1,154 @@
+# ======================
+# ASYNC PIPELINE LOAD TEST
+# ======================
+# Simulates N concurrent chat sessions, each sending a few messages back to
+# back, against the fake OpenRouter server, and compares:
+#
+#   blocking  every call is a blocking llm_client request on a worker thread
+#             pool of --threads (the old model: one thread held per request)
+#   async     every call goes through async_llm.Pipeline on one event loop,
+#             with --max-in-flight requests on the wire
+#
+# Latency is measured from when a session wants to send until its reply
+# arrives, so time spent waiting for a free thread or slot is included.
+# "sessions/process" is the largest session count whose p95 stays within
+# --slo seconds.
+#
+#   python benchmarks/load_async_llm.py [--sessions 32,64,128,256,512] [--latency 0.5]
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import fake_openrouter
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class ThreadSampler:
+    """Records the peak thread count while running"""
+
+    def __enter__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(0.01):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_blocking(sessions, turns, threads):
+    import llm_client
+
+    latencies, errors = [], []
+    done = threading.Event()
+    remaining = [sessions]
+    lock = threading.Lock()
+    pool = ThreadPoolExecutor(max_workers=threads)
+
+    def send(user, turn, wanted_at):
+        try:
+            llm_client.chat_completion("bench", [{"role": "user", "content": f"{user} {turn}"}])
+            latencies.append(time.perf_counter() - wanted_at)
+        except Exception as e:
+            errors.append(e)
+        if turn + 1 < turns:
+            pool.submit(send, user, turn + 1, time.perf_counter())
+            return
+        with lock:
+            remaining[0] -= 1
+            if not remaining[0]:
+                done.set()
+
+    start = time.perf_counter()
+    for user in range(sessions):
+        pool.submit(send, f"user{user}", 0, start)
+    done.wait()
+    elapsed = time.perf_counter() - start
+    pool.shutdown()
+    return latencies, errors, elapsed
+
+
+def run_async(sessions, turns, max_in_flight):
+    import async_llm
+
+    pipeline = async_llm.Pipeline(max_in_flight=max_in_flight, max_queued=sessions * turns)
+    latencies, errors = [], []
+
+    async def session(user):
+        for turn in range(turns):
+            wanted_at = time.perf_counter()
+            try:
+                await asyncio.wrap_future(
+                    pipeline.submit(user, "bench", [{"role": "user", "content": f"{user} {turn}"}])
+                )
+                latencies.append(time.perf_counter() - wanted_at)
+            except Exception as e:
+                errors.append(e)
+
+    async def main():
+        await asyncio.gather(*(session(f"user{u}") for u in range(sessions)))
+
+    pipeline.start()
+    start = time.perf_counter()
+    asyncio.run(main())
+    elapsed = time.perf_counter() - start
+    pipeline.close()
+    return latencies, errors, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test blocking vs async LLM calls")
+    parser.add_argument("--sessions", default="32,64,128,256,512",
+                        help="comma-separated concurrent session counts")
+    parser.add_argument("--turns", type=int, default=3, help="messages per session")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake server latency per reply")
+    parser.add_argument("--threads", type=int, default=32, help="worker threads for the blocking run")
+    parser.add_argument("--max-in-flight", type=int, default=256)
+    parser.add_argument("--slo", type=float, default=None, help="p95 target in seconds (default 3x latency)")
+    args = parser.parse_args()
+    slo = args.slo or 3 * args.latency
+
+    server, base_url = fake_openrouter.start_in_thread(latency=args.latency)
+    os.environ["OPENROUTER_BASE_URL"] = base_url
+    # The fake server answers every request; don't let retries blur the numbers
+    os.environ["MINDLY_HTTP_RETRIES"] = "0"
+
+    print(f"fake server at {base_url}, latency {args.latency}s, {args.turns} turns/session, p95 SLO {slo:.2f}s")
+    print(f"{'mode':<9}{'sessions':>9}{'req/s':>9}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'errors':>8}{'threads':>9}")
+    capacity = {"blocking": 0, "async": 0}
+    for sessions in [int(s) for s in args.sessions.split(",")]:
+        for mode in ("blocking", "async"):
+            with ThreadSampler() as sampler:
+                if mode == "blocking":
+                    latencies, errors, elapsed = run_blocking(sessions, args.turns, args.threads)
+                else:
+                    latencies, errors, elapsed = run_async(sessions, args.turns, args.max_in_flight)
+            # The fake server's own per-connection threads are counted too
+            p95 = percentile(latencies, 0.95) if latencies else float("inf")
+            if p95 <= slo and not errors:
+                capacity[mode] = max(capacity[mode], sessions)
+            print(f"{mode:<9}{sessions:>9}{len(latencies) / elapsed:>9.1f}"
+                  f"{statistics.median(latencies) if latencies else float('nan'):>8.2f}"
+                  f"{p95:>8.2f}{percentile(latencies, 0.99) if latencies else float('nan'):>8.2f}"
+                  f"{len(errors):>8}{sampler.peak:>9}")
+
+    print(f"sessions/process within SLO: blocking {capacity['blocking']}, async {capacity['async']}")
+    server.shutdown()
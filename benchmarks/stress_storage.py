@@ -0,0 +1,185 @@
+# ======================
+# STORAGE CONCURRENCY STRESS TEST
+# ======================
+# Many processes x threads hammer one data directory at once:
+#
+#   - every writer saves its own conversation for one of a few shared users,
+#     one delta at a time (like autosave), and renames it now and then
+#   - every writer also replays one stale delta, which must be rejected with
+#     safe_io.Conflict rather than overwrite newer messages
+#   - writers register new accounts concurrently (users.yaml)
+#   - with --kill, some writer processes are SIGKILLed part-way through
+#
+# Afterwards everything is checked from a fresh process: every account is in
+# users.yaml, every conversation holds exactly the messages its writer
+# finished saving (a prefix of them for killed writers), conversation
+# indexes and trait totals agree with the log, and no temp files are left
+# (unless a writer was killed mid-write).
+# Exits non-zero on any violation.
+#
+#   python benchmarks/stress_storage.py [--processes 8] [--threads 4] [--saves 25] [--kill 2]
+#   MINDLY_STORAGE=sqlite python benchmarks/stress_storage.py
+
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+USERS = ["ana", "ben", "chloe"]
+TRAITS = ["Empathy", "Anxiety", "Optimism"]
+
+
+def message(writer, i):
+    role = "user" if i % 2 else "assistant"
+    return {"role": role, "content": f"{writer} message {i}"}
+
+def writer(data_dir, name, saves, progress):
+    """One session: conversation name, saved delta by delta; returns stale rejections"""
+    import chat_store
+    import repository
+    import safe_io
+    chat_store.USERDATA_DIR = data_dir
+    repo = repository.get_repository(os.path.join(data_dir, "users.yaml"))
+    username = USERS[sum(map(ord, name)) % len(USERS)]
+    conflicts = 0
+    previous = None
+    for n in range(saves):
+        base = 2 * n
+        traits = {t: n % (i + 2) for i, t in enumerate(TRAITS)}
+        repo.append_delta(username, name, base, [message(name, base), message(name, base + 1)],
+                          traits, previous_traits=previous)
+        previous = traits
+        progress[name] = base + 2
+        if n == saves // 2:
+            try:
+                repo.append_delta(username, name, 0, [message("stale", 0)], traits, previous_traits=traits)
+            except safe_io.Conflict:
+                conflicts += 1
+        if n % 10 == 3:
+            repo.rename_chat(username, name, f"chat {name} #{n}")
+        if n % 5 == 0:
+            repo.add_user(f"{name}-{n}", "", "hash")
+    return conflicts
+
+def process_main(data_dir, index, threads, saves, progress, results):
+    conflicts = []
+
+    def run(t):
+        conflicts.append(writer(data_dir, f"p{index}t{t}", saves, progress))
+
+    workers = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    results[index] = sum(conflicts)
+
+
+def verify(data_dir, progress, killed, processes, threads, saves):
+    import chat_store
+    import repository
+    chat_store.USERDATA_DIR = data_dir
+    repo = repository.get_repository(os.path.join(data_dir, "users.yaml"))
+    problems = []
+
+    registered = set(repo.list_usernames())
+    for p in range(processes):
+        for t in range(threads):
+            name = f"p{p}t{t}"
+            # Registered after save n; for a killed writer, known done once save n + 1 was
+            expected = {f"{name}-{n}" for n in range(0, saves, 5)
+                        if p not in killed or 2 * n + 4 <= progress.get(name, 0)}
+            missing = expected - registered
+            if missing:
+                problems.append(f"accounts missing from users.yaml: {sorted(missing)}")
+
+    seen = 0
+    for username in USERS:
+        conversations = {c["conversation_id"]: c for c in repo.load_conversations(username)}
+        if repo.count_conversations(username) != len(conversations):
+            problems.append(f"{username}: conversation index lists {repo.count_conversations(username)}, "
+                            f"log has {len(conversations)}")
+        totals = {}
+        for name, convo in conversations.items():
+            seen += 1
+            p = int(name[1:name.index("t")])
+            saved = len(convo["messages"])
+            wanted = [message(name, i) for i in range(saved)]
+            if convo["messages"] != wanted:
+                problems.append(f"{username}/{name}: messages corrupted or overwritten")
+            if p not in killed and saved != 2 * saves:
+                problems.append(f"{username}/{name}: {saved} messages saved, expected {2 * saves}")
+            if saved < progress.get(name, 0):
+                problems.append(f"{username}/{name}: lost acknowledged saves ({saved} < {progress[name]})")
+            loaded = repo.load_conversation(username, name)
+            if loaded is None or loaded["messages"] != convo["messages"]:
+                problems.append(f"{username}/{name}: load_conversation disagrees with the log")
+            for trait, value in convo.get("traits", {}).items():
+                totals[trait] = totals.get(trait, 0) + value
+        running = {t: v for t, v in repo.total_traits(username).items() if v}
+        if running != {t: v for t, v in totals.items() if v}:
+            problems.append(f"{username}: running trait totals {running} != {totals}")
+
+    leftovers = [f for f in os.listdir(data_dir) if f.endswith(".tmp")]
+    if leftovers and not killed:  # a killed writer may leave its temp file, never a torn target
+        problems.append(f"temp files left behind: {leftovers}")
+    return seen, problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent writers against the storage backend")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=4, help="writer threads per process")
+    parser.add_argument("--saves", type=int, default=25, help="deltas per conversation")
+    parser.add_argument("--kill", type=int, default=0, help="processes to SIGKILL part-way")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="mindly-stress-")
+    os.environ.setdefault("MINDLY_DB_PATH", os.path.join(data_dir, "mindly.db"))
+    os.environ.setdefault("MINDLY_SEARCH_PATH", os.path.join(data_dir, "search.db"))
+    import repository
+    repository.get_repository(os.path.join(data_dir, "users.yaml"))
+    if os.environ.get("MINDLY_STORAGE", "file").lower() == "sqlite":
+        # SQLite rows reference users, so the shared users must exist up front
+        for username in USERS:
+            repository.get_repository(os.path.join(data_dir, "users.yaml")).add_user(username, "", "hash")
+
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Manager() as manager:
+        progress, results = manager.dict(), manager.dict()
+        procs = [ctx.Process(target=process_main,
+                             args=(data_dir, i, args.threads, args.saves, progress, results))
+                 for i in range(args.processes)]
+        start = time.perf_counter()
+        for proc in procs:
+            proc.start()
+        killed = set()
+        if args.kill:
+            # Kill while saves are under way, not during interpreter start-up
+            while sum(progress.values()) < args.processes * args.threads * args.saves // 2:
+                time.sleep(0.01)
+            for i, proc in enumerate(procs[:args.kill]):
+                os.kill(proc.pid, signal.SIGKILL)
+                killed.add(i)
+        for proc in procs:
+            proc.join()
+        elapsed = time.perf_counter() - start
+        progress, results = dict(progress), dict(results)
+
+    writers = args.processes * args.threads
+    saves = sum(v // 2 for v in progress.values())
+    print(f"{writers} writers ({args.processes} processes x {args.threads} threads), "
+          f"{len(killed)} processes killed, data in {data_dir}")
+    print(f"{saves} deltas saved in {elapsed:.2f}s ({saves / elapsed:.0f}/s), "
+          f"{sum(results.values())} stale writes rejected")
+    seen, problems = verify(data_dir, progress, killed, args.processes, args.threads, args.saves)
+    print(f"verified {seen} conversations: {'OK' if not problems else f'{len(problems)} problems'}")
+    for problem in problems[:20]:
+        print("  " + problem)
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,90 @@
+# ======================
+# SYNTHETIC USERS & HISTORIES
+# ======================
+# Fills a data directory with accounts and saved conversations at realistic
+# sizes, through the repository API so either storage backend
+# (MINDLY_STORAGE) gets exactly the files and indexes the app would write:
+# config/users.yaml, userdata/<user>_chats.* and the search index.
+#
+# Conversation lengths and trait scores vary per chat; message text comes
+# from bench_matcher's corpus, so trait keywords and advice phrases show up
+# about as often as in real replies. Every account's password is
+# password_for(username).
+#
+#   python benchmarks/synthetic_data.py /tmp/mindly-data [--users 20] [--chats 30] [--messages 24]
+#   cd /tmp/mindly-data && streamlit run /path/to/chatbottherapy.py
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_matcher import make_corpus
+
+
+def username_for(i):
+    return f"user{i:03d}"
+
+def password_for(username):
+    return f"{username}-password"
+
+def conversation(rng, corpus, messages):
+    """(messages, traits, advice) for one chat of about the given length"""
+    from chat_engine import GREETING
+    from trait_matcher import default_matcher
+    count = max(2, int(rng.triangular(2, 2 * messages, messages))) // 2 * 2
+    transcript = [{"role": "assistant", "content": GREETING}]
+    for i in range(1, count):
+        transcript.append({"role": "user" if i % 2 else "assistant", "content": rng.choice(corpus)})
+
+    traits, advice = {}, []
+    for message in transcript:
+        if message["role"] != "assistant":
+            continue
+        hits, sentences = default_matcher.scan(message["content"])
+        for trait, n in hits.items():
+            traits[trait] = traits.get(trait, 0) + n
+        advice.extend(sentences)
+    return transcript, traits, advice
+
+def populate(data_dir, users=20, chats=30, messages=24, seed=7, log=print):
+    """Create users and their saved chats under data_dir. Returns the usernames."""
+    os.makedirs(data_dir, exist_ok=True)
+    os.chdir(data_dir)
+    import chat_store
+    import passwords
+    import repository
+    chat_store.USERDATA_DIR = "userdata"
+    os.makedirs(chat_store.USERDATA_DIR, exist_ok=True)
+    repo = repository.get_repository(os.path.join("config", "users.yaml"))
+
+    rng = random.Random(seed)
+    corpus = make_corpus(500, seed)
+    names = [username_for(i) for i in range(users)]
+    start = time.perf_counter()
+    saved = 0
+    for username in names:
+        if not repo.user_exists(username):
+            repo.add_user(username, f"{username}@example.com", passwords.hash_password(password_for(username)))
+        for c in range(rng.randint(chats // 2, chats + chats // 2) if chats else 0):
+            transcript, traits, _ = conversation(rng, corpus, messages)
+            repo.append_delta(username, f"{username}-chat{c:04d}", 0, transcript, traits)
+            saved += len(transcript)
+    passwords.shutdown()
+    log(f"{len(names)} users, {saved} messages saved in {time.perf_counter() - start:.1f}s under {data_dir}")
+    return names
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Populate a Mindly data directory with synthetic users")
+    parser.add_argument("data_dir")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--chats", type=int, default=30, help="average saved chats per user")
+    parser.add_argument("--messages", type=int, default=24, help="average messages per chat")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    populate(os.path.abspath(args.data_dir), args.users, args.chats, args.messages, args.seed)
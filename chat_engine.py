@@ -0,0 +1,531 @@
+# ======================
+# MINDLY CHAT ENGINE
+# ======================
+# Everything the app does that isn't UI: replies, trait and advice
+# extraction, saving and profile totals. State lives on an explicit
+# ChatSession rather than st.session_state, so the same code runs inside
+# the Streamlit script (chatbottherapy.py) and behind the HTTP API (api.py).
+# Errors that the UI should show are passed to an optional on_error callback.
+
+import asyncio
+import copy
+import os
+import secrets
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+
+import advice_refiner
+import context_window
+import llm_cache
+import llm_client
+import metrics
+import safe_io
+import trait_matcher
+import write_behind
+from message_buffer import Message, MessageBuffer, Spilled
+
+GREETING = "Hello, I'm here to listen. What would you like to share today?"
+TRAITS = ["Empathy", "Self-Awareness", "Anxiety", "Optimism", "Mood Swings", "Confidence"]
+AUTOSAVE_INTERVAL_SECONDS = 300
+# Autosave every exchange through the background writer (write_behind)
+# instead of writing inline at most every AUTOSAVE_INTERVAL_SECONDS
+WRITE_BEHIND = os.environ.get("MINDLY_WRITE_BEHIND", "1") != "0"
+# Route chat replies through the shared async pipeline (async_llm) instead of
+# a blocking request on the calling thread
+ASYNC_LLM = os.environ.get("MINDLY_ASYNC_LLM", "1") != "0"
+# Turns that fall out of the context window are folded into the rolling
+# summary once this many have piled up, so most replies need no summary call
+SUMMARY_REFRESH_MESSAGES = int(os.environ.get("MINDLY_SUMMARY_REFRESH", "6"))
+SUMMARY_TOKENS = int(os.environ.get("MINDLY_SUMMARY_TOKENS", "250"))
+# Messages that are saved and already folded into the summary are dropped
+# from memory, except for this many most recent ones
+SESSION_WINDOW = int(os.environ.get("MINDLY_SESSION_WINDOW", "40"))
+
+EMERGENCY_PHRASES = ["kill myself", "end it all", "don't want to live"]
+EMERGENCY_REPLY = """I hear you're in tremendous pain. You're not alone. Please:
+
+        1. Tap the 🆘 button in the sidebar for immediate help
+        2. Consider calling a trusted friend
+        3. Know this feeling can pass
+
+        I'm here to listen too."""
+FALLBACK_REPLY = "I'm here for you—can you share a bit more?"
+FALLBACK_SUMMARY = "Your emotional patterns show interesting depth across our conversations."
+
+THERAPIST_PROMPT = """As an empathetic therapist, reply to the person you are talking with so that your response:
+    - Validates the person's feelings naturally
+    - Asks thoughtful open-ended questions
+    - Helps explore thoughts without being directive
+    - Sounds completely natural without instructions
+    - Don't describe your tone
+    - Don't make any visual gestures, just offer a lending ear and advice when asked for
+    - Add an appropriate emoji for the response also
+    - Offer tips and advice when asked for
+
+    Respond in 2-3 sentences."""
+
+CONVERSATION_SUMMARY_PROMPT = """You keep running notes on a supportive conversation between a person and their therapist.
+
+    Notes so far:
+    {summary}
+
+    New exchanges:
+    {turns}
+
+    Rewrite the notes to include the new exchanges. Keep what matters for continuing the conversation:
+    what the person is going through, how they feel, people and events they mentioned, and advice
+    already given. Write in third person, at most {words} words, no preamble."""
+
+PROFILE_SUMMARY_PROMPT = """Create a 2-3 sentence personalized summary of someone's emotional patterns based on these trait scores:
+    {traits_text}
+
+    Guidelines:
+    - Sound warm and human, like a therapist would
+    - Mention specific patterns but don't list numbers
+    - Note both strengths and growth areas
+    - Keep it concise and insightful
+    - Never use phrases like "based on your data"
+    - Write in second person ("You tend to...")
+
+    Example good output:
+    "You have a thoughtful way of reflecting on your experiences, though sometimes anxious thoughts come through. I notice you often find hopeful perspectives too."
+    """
+
+
+def api_key_from_env():
+    return os.environ.get("OPENROUTER_API_KEY", "")
+
+
+# ======================
+# SESSION STATE
+# ======================
+def _greeting():
+    return MessageBuffer([Message("assistant", GREETING)])
+
+@dataclass
+class ChatSession:
+    """One user's in-progress conversation and its save bookkeeping.
+
+    messages is a MessageBuffer: len() and positions cover the whole
+    conversation, but only the messages from messages.offset on are in memory
+    (see compact()).
+    """
+    user: str = None
+    messages: MessageBuffer = field(default_factory=_greeting)
+    traits: dict = field(default_factory=lambda: {t: 0 for t in TRAITS})
+    advice_points: list = field(default_factory=list)
+    reactions: dict = field(default_factory=dict)
+    autosave_enabled: bool = True
+    last_save_time: datetime = None
+    conversation_id: str = field(default_factory=lambda: secrets.token_hex(8))
+    saved_message_count: int = 0
+    saved_traits: dict = None
+    summary: str = ""
+    summary_upto: int = 0
+
+    def start_new_conversation(self):
+        """Reset the per-conversation save bookkeeping"""
+        self.conversation_id = secrets.token_hex(8)
+        self.saved_message_count = 0
+        self.saved_traits = None
+
+    def reset(self):
+        """Start over with a fresh greeting (the New Chat button)"""
+        self.messages = _greeting()
+        self.traits = {k: 0 for k in self.traits}
+        self.summary, self.summary_upto = "", 0
+        self.start_new_conversation()
+
+    def compact(self, durable=None):
+        """Drop messages from memory that are saved, summarized and outside the
+        last SESSION_WINDOW. Returns how many were dropped.
+
+        durable is how many messages are actually in storage when that is
+        fewer than saved_message_count (deltas still queued for writing).
+        """
+        saved = self.saved_message_count if durable is None else min(durable, self.saved_message_count)
+        upto = min(saved, self.summary_upto, len(self.messages) - SESSION_WINDOW)
+        return self.messages.spill(upto)
+
+    def to_dict(self):
+        data = {f.name: copy.deepcopy(getattr(self, f.name)) for f in fields(self) if f.name != "messages"}
+        data["messages"] = self.messages.to_list()
+        data["message_offset"] = self.messages.offset
+        data["last_save_time"] = self.last_save_time.isoformat() if self.last_save_time else None
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        if data.get("last_save_time"):
+            data["last_save_time"] = datetime.fromisoformat(data["last_save_time"])
+        if "messages" in data:
+            data["messages"] = MessageBuffer(data["messages"], data.get("message_offset", 0))
+        known = cls.__dataclass_fields__
+        return cls(**{k: v for k, v in data.items() if k in known})
+
+
+# ======================
+# TRAIT & ADVICE EXTRACTION
+# ======================
+def update_traits(session, text):
+    for trait, hits in trait_matcher.default_matcher.trait_hits(text).items():
+        session.traits[trait] = session.traits.get(trait, 0) + hits
+
+def extract_advice(session, response):
+    """Identify and store advice points from AI responses"""
+    for sentence in trait_matcher.default_matcher.advice_sentences(response):
+        session.advice_points.append({
+            "text": sentence,
+            "timestamp": datetime.now().isoformat(),
+            "refined": False,
+            "uid": secrets.token_hex(3)
+        })
+
+@metrics.timed("refine_advice_text")
+def refine_advice_text(raw_text, api_key):
+    """Use AI to transform fragments into complete advice sentences"""
+    return advice_refiner.refine_one(api_key, raw_text)
+
+
+# ======================
+# OPENROUTER RESPONSE
+# ======================
+def _window(session):
+    """(start, convo) for the next reply; start indexes session.messages"""
+    if session.summary_upto > len(session.messages):
+        session.summary, session.summary_upto = "", 0
+    start, convo = context_window.build(
+        THERAPIST_PROMPT, session.messages[session.summary_upto:], session.summary
+    )
+    return session.summary_upto + start, convo
+
+def build_convo(session):
+    """Chat messages for the next reply: instructions and rolling summary, then recent turns within the token budget"""
+    return _window(session)[1]
+
+def is_emergency(convo):
+    recent = [m["content"] for m in convo if m["role"] != "system"][-4:]
+    text = "\n".join(recent).lower()
+    return any(phrase in text for phrase in EMERGENCY_PHRASES)
+
+@metrics.timed("refresh_summary")
+def refresh_summary(session, api_key):
+    """Fold turns that no longer fit the context window into the rolling summary.
+
+    Does nothing until SUMMARY_REFRESH_MESSAGES such turns have piled up; the
+    previous summary is extended rather than rebuilt. Returns True if updated.
+    """
+    start, _ = _window(session)
+    pending = session.messages[session.summary_upto:start]
+    if len(pending) < SUMMARY_REFRESH_MESSAGES:
+        return False
+    turns = "\n".join(f"{m['role']}: {m['content']}" for m in pending)
+    # Bounded even if earlier refreshes failed and turns piled up
+    turns = context_window.truncate_to_tokens(turns, 4 * context_window.CONTEXT_TOKENS)
+    words = SUMMARY_TOKENS * 3 // 4
+    prompt = CONVERSATION_SUMMARY_PROMPT.format(summary=session.summary or "(none yet)", turns=turns, words=words)
+    try:
+        summary = llm_cache.cached_call(
+            llm_client.DEFAULT_MODEL, CONVERSATION_SUMMARY_PROMPT, f"{session.summary}\n{turns}", 0.3,
+            lambda: _complete(
+                session, api_key,
+                [{"role": "user", "content": prompt}],
+                endpoint="summary",
+                temperature=0.3
+            )
+        )
+    except Exception:
+        return False
+    session.summary = context_window.truncate_to_tokens(summary, SUMMARY_TOKENS, keep="start")
+    session.summary_upto = start
+    return True
+
+def _pipeline():
+    import async_llm  # pulls in httpx; deferred until the first reply is requested
+    return async_llm.default_pipeline()
+
+def _complete(session, api_key, messages, **kwargs):
+    if ASYNC_LLM:
+        return _pipeline().submit(session.user, api_key, messages, **kwargs).result()
+    return llm_client.chat_completion(api_key, messages, **kwargs)
+
+async def _complete_async(session, api_key, messages, **kwargs):
+    """_complete() for coroutines; the blocking path runs on a worker thread"""
+    if ASYNC_LLM:
+        return await asyncio.wrap_future(_pipeline().submit(session.user, api_key, messages, **kwargs))
+    return await asyncio.to_thread(llm_client.chat_completion, api_key, messages, **kwargs)
+
+def _stream(session, api_key, messages):
+    if ASYNC_LLM:
+        return _pipeline().stream(session.user, api_key, messages)
+    return llm_client.stream_chat_completion(api_key, messages)
+
+@metrics.timed("get_response")
+def get_response(session, convo, api_key, on_error=None):
+    if is_emergency(convo):
+        return EMERGENCY_REPLY
+
+    try:
+        reply = _complete(session, api_key, convo)
+        extract_advice(session, reply)
+        return reply
+    except Exception as e:
+        if on_error:
+            on_error(f"Error getting AI response: {e}")
+        return FALLBACK_REPLY
+
+def stream_response(session, convo, api_key, on_error=None):
+    """Yield the reply token by token; falls back to get_response() if streaming fails before any output"""
+    if is_emergency(convo):
+        yield EMERGENCY_REPLY
+        return
+
+    # Spans the whole reply as the user sees it, rendering included
+    with metrics.span("stream_response"):
+        parts = []
+        try:
+            for token in _stream(session, api_key, convo):
+                parts.append(token)
+                yield token
+        except Exception as e:
+            if not parts:
+                yield get_response(session, convo, api_key, on_error)
+                return
+            if on_error:
+                on_error(f"Reply was cut short: {e}")
+
+        reply = "".join(parts).strip()
+        if not reply:
+            yield FALLBACK_REPLY
+            return
+        extract_advice(session, reply)
+
+def add_user_message(session, text):
+    session.messages.append(Message("user", text))
+
+def add_assistant_reply(session, reply):
+    """Score a finished reply and append it to the transcript"""
+    update_traits(session, reply)
+    session.messages.append(Message("assistant", reply))
+
+def message_page(session, repo, start, stop):
+    """Messages [start, stop) of the conversation, reading spilled ones back from storage"""
+    try:
+        return session.messages[start:stop]
+    except Spilled:
+        pass
+    offset = session.messages.offset
+    convo = repo.load_conversation(session.user, session.conversation_id)
+    earlier = convo["messages"][start:offset] if convo else []
+    return earlier + session.messages[offset:stop]
+
+def chat_turn(session, user_input, api_key, on_error=None):
+    """One full non-streaming exchange; returns the reply"""
+    add_user_message(session, user_input)
+    reply = get_response(session, build_convo(session), api_key, on_error)
+    add_assistant_reply(session, reply)
+    refresh_summary(session, api_key)
+    return reply
+
+async def chat_turn_async(session, user_input, api_key, on_error=None):
+    """chat_turn() for coroutines: waits on the async pipeline without holding
+    a thread (or on a worker thread with MINDLY_ASYNC_LLM=0).
+
+    The rolling summary isn't refreshed here, so the caller can save the
+    exchange first and call refresh_summary() afterwards.
+    """
+    add_user_message(session, user_input)
+    convo = build_convo(session)
+    if is_emergency(convo):
+        reply = EMERGENCY_REPLY
+    else:
+        try:
+            reply = await _complete_async(session, api_key, convo)
+            extract_advice(session, reply)
+        except Exception as e:
+            if on_error:
+                on_error(f"Error getting AI response: {e}")
+            reply = FALLBACK_REPLY
+    add_assistant_reply(session, reply)
+    return reply
+
+
+# ======================
+# SAVING
+# ======================
+def _unsaved_delta(session):
+    """(base, messages) not saved yet, or None if nothing changed"""
+    messages = session.messages
+    base = session.saved_message_count
+    if base > len(messages):
+        session.start_new_conversation()
+        base = 0
+    if base == len(messages) and session.saved_traits == session.traits:
+        return None
+    return base, [m.to_dict() for m in messages[base:]]
+
+def _saved_upto(session):
+    session.saved_message_count = len(session.messages)
+    session.saved_traits = dict(session.traits)
+
+def _fork_conversation(session, repo, reactions):
+    """Someone else saved to this conversation since (e.g. a replayed API
+    session); keep both by saving this transcript as a new conversation"""
+    transcript = message_page(session, repo, 0, len(session.messages))
+    session.start_new_conversation()
+    repo.append_delta(session.user, session.conversation_id, 0,
+                      [{"role": m["role"], "content": m["content"]} for m in transcript],
+                      session.traits, reactions)
+    _saved_upto(session)
+
+def _recover_queued_saves(session, repo, reactions):
+    """Deal with deltas the background writer gave up on. Returns True if the transcript was forked.
+
+    After a stale delta the transcript is saved as a new conversation. After
+    a write that kept failing, the messages that didn't reach storage are
+    marked unsaved again and write_behind.SaveFailed is raised.
+    """
+    writer = write_behind.current_writer()
+    halted = writer.take_halted(session.user, session.conversation_id) if writer is not None else None
+    if halted is None:
+        return False
+    durable, error = halted
+    if error is None:
+        _fork_conversation(session, repo, reactions)
+        session.compact()
+        return True
+    session.saved_message_count = min(durable, session.saved_message_count)
+    session.saved_traits = None
+    raise write_behind.SaveFailed(f"couldn't write recent messages ({error}); they'll be saved again next time")
+
+def wait_for_saves(user, conversation_id=None):
+    """Block until autosaves queued for the user (or one conversation) are written.
+
+    Raises write_behind.SaveTimeout after MINDLY_SAVE_WAIT seconds.
+    """
+    writer = write_behind.current_writer()
+    if writer is not None and not writer.drain(user, conversation_id, write_behind.SAVE_WAIT):
+        raise write_behind.SaveTimeout("recent messages are still being saved")
+
+@metrics.timed("save_chat")
+def save_chat_delta(session, repo, reactions=None):
+    """Append only the messages added since the last save, before returning.
+    Returns False if nothing changed."""
+    wait_for_saves(session.user, session.conversation_id)
+    try:
+        if _recover_queued_saves(session, repo, reactions):
+            return True
+    except write_behind.SaveFailed:
+        pass  # written below, from the last message that reached storage
+    delta = _unsaved_delta(session)
+    if delta is None:
+        return False
+    base, messages = delta
+    try:
+        repo.append_delta(
+            session.user,
+            session.conversation_id,
+            base,
+            messages,
+            session.traits,
+            reactions,
+            previous_traits=session.saved_traits
+        )
+    except safe_io.Conflict:
+        _fork_conversation(session, repo, reactions)
+    else:
+        _saved_upto(session)
+    session.compact()
+    return True
+
+def queue_chat_delta(session, repo, reactions=None):
+    """Hand the unsaved messages to the background writer. Returns False if nothing changed.
+
+    Raises write_behind.QueueFull when the writer is backed up, and
+    write_behind.SaveFailed when earlier deltas couldn't be written; either
+    way the messages stay unsaved and go out with the next save.
+    """
+    if _recover_queued_saves(session, repo, reactions):
+        return True
+    delta = _unsaved_delta(session)
+    if delta is None:
+        return False
+    base, messages = delta
+    writer = write_behind.default_writer()
+    writer.submit(write_behind.SaveJob(repo, session.user, session.conversation_id, base, messages,
+                                       session.traits, reactions, session.saved_traits))
+    _saved_upto(session)
+    # Only what has reached storage may be dropped from memory
+    session.compact(writer.durable_count(session.user, session.conversation_id, base))
+    return True
+
+def autosave_due(session):
+    return (session.autosave_enabled and
+            len(session.messages) > 1 and
+            (session.last_save_time is None or
+             (datetime.now() - session.last_save_time).seconds > AUTOSAVE_INTERVAL_SECONDS))
+
+@metrics.timed("autosave_chat")
+def autosave_chat(session, repo, background=None):
+    """Save the chat after an exchange if autosave is on. Returns True if something was saved or queued.
+
+    In the background (MINDLY_WRITE_BEHIND, the default) every exchange is
+    queued and written within moments; otherwise it is written here, at most
+    every AUTOSAVE_INTERVAL_SECONDS.
+    """
+    if WRITE_BEHIND if background is None else background:
+        if session.autosave_enabled and len(session.messages) > 1 and \
+                queue_chat_delta(session, repo, session.reactions):
+            session.last_save_time = datetime.now()
+            return True
+        return False
+    if autosave_due(session) and save_chat_delta(session, repo, session.reactions):
+        session.last_save_time = datetime.now()
+        return True
+    return False
+
+
+# ======================
+# PROFILE
+# ======================
+@metrics.timed("generate_profile_summary")
+def generate_profile_summary(total_traits, api_key):
+    """Generate a unique, natural-sounding summary using AI"""
+    dominant_traits = sorted(total_traits.items(), key=lambda x: x[1], reverse=True)
+    traits_text = ", ".join([f"{trait.lower()} ({score})" for trait, score in dominant_traits if score > 0])
+
+    prompt = PROFILE_SUMMARY_PROMPT.format(traits_text=traits_text)
+
+    try:
+        return llm_cache.cached_call(
+            llm_client.DEFAULT_MODEL, PROFILE_SUMMARY_PROMPT, traits_text, 0.8,
+            lambda: llm_client.chat_completion(
+                api_key,
+                [{"role": "user", "content": prompt}],
+                endpoint="summary",
+                temperature=0.8
+            )
+        )
+    except Exception:
+        return FALLBACK_SUMMARY
+
+@metrics.timed("calculate_total_traits")
+def calculate_total_traits(session, repo, wait=True):
+    """Calculate cumulative traits from all saved chats plus the unsaved part of this one.
+
+    With wait, autosaves still queued for the user are written first (see
+    wait_for_saves()).
+    """
+    if wait:
+        wait_for_saves(session.user)
+    total_traits = {trait: 0 for trait in session.traits}
+
+    for trait, value in repo.total_traits(session.user).items():
+        total_traits[trait] = total_traits.get(trait, 0) + value
+
+    saved = session.saved_traits or {}
+    for trait, value in session.traits.items():
+        total_traits[trait] += value - saved.get(trait, 0)
+
+    return total_traits
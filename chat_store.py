@@ -0,0 +1,697 @@
+# ======================
+# APPEND-ONLY CHAT STORE
+# ======================
+# Each user's chats live in two files under USERDATA_DIR:
+#   <user>_chats.jsonl  - one JSON record per line, only ever appended to
+#   <user>_chats.idx    - fixed-width "offset length" lines, one per record
+# Saving a chat appends one line to each file, so the cost of a save does not
+# depend on how much history the user already has. Older <user>_chats.json
+# files are imported the first time the store is touched for that user.
+#
+# Records are deltas: a conversation id, the number of messages saved before
+# this record ("base") and only the messages added since then. Full
+# transcripts are rebuilt by load_conversations(). Records written before
+# deltas existed (no "conversation_id") are read as one-record conversations.
+#
+# A third file, <user>_convos.idx, lists conversations for the Saved page
+# (see CONVERSATION INDEX below), and each record carries the log offset of
+# the previous record of its conversation ("prev"), so one transcript can be
+# loaded without reading anyone else's.
+#
+# Every write, and every repair of a file left behind by a crash, happens
+# under the user's lock (<user>_chats.lock, see safe_io), so two sessions
+# or processes saving for the same user take turns. Files that are
+# rewritten rather than appended to are replaced atomically. A delta whose
+# "base" doesn't match the number of messages already saved for its
+# conversation was made from a stale copy and is rejected with
+# safe_io.Conflict instead of overwriting newer messages.
+
+import json
+import os
+from datetime import datetime
+
+import safe_io
+
+USERDATA_DIR = "userdata"
+
+INDEX_ENTRY = "{:012d} {:010d}\n"
+INDEX_ENTRY_SIZE = len(INDEX_ENTRY.format(0, 0))
+
+
+def is_safe_username(username):
+    """True if username can be part of a file name under USERDATA_DIR"""
+    return (isinstance(username, str) and 0 < len(username) <= 64 and username.isprintable()
+            and not username.startswith(".") and "/" not in username and "\\" not in username)
+
+def _user_file(username, suffix):
+    if not is_safe_username(username):
+        raise ValueError(f"unsafe username: {username!r}")
+    return os.path.join(USERDATA_DIR, f"{username}{suffix}")
+
+def legacy_path(username):
+    """Path of the old whole-file JSON list"""
+    return _user_file(username, "_chats.json")
+
+def log_path(username):
+    """Path of the append-only record log"""
+    return _user_file(username, "_chats.jsonl")
+
+def index_path(username):
+    """Path of the fixed-width offset index"""
+    return _user_file(username, "_chats.idx")
+
+def names_path(username):
+    """Path of the small display-name overrides file"""
+    return _user_file(username, "_chat_names.json")
+
+def _locked(username):
+    """The user's write lock; held around every change to their files"""
+    return safe_io.locked(_user_file(username, "_chats"))
+
+
+def _encode(record):
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+def _append(username, record):
+    line = _encode(record)
+    with open(log_path(username), "ab") as log:
+        offset = log.seek(0, os.SEEK_END)
+        log.write(line)
+    with open(index_path(username), "a") as idx:
+        idx.write(INDEX_ENTRY.format(offset, len(line)))
+    return offset
+
+
+def _rebuild_index(username):
+    """Recreate the offset index by scanning the log (used after a crash)"""
+    entries = []
+    offset = 0
+    with open(log_path(username), "rb") as log:
+        for line in log:
+            if line.endswith(b"\n"):
+                entries.append(INDEX_ENTRY.format(offset, len(line)))
+            offset += len(line)
+    safe_io.atomic_write(index_path(username), "".join(entries))
+
+def _has_torn_tail(username):
+    """True if the log doesn't end with a complete line"""
+    with open(log_path(username), "rb") as log:
+        size = log.seek(0, os.SEEK_END)
+        if size == 0:
+            return False
+        log.seek(size - 1)
+        return log.read(1) != b"\n"
+
+def _truncate_torn_tail(username):
+    """Drop a partially written last line left behind by a crash mid-append"""
+    if not _has_torn_tail(username):
+        return
+    with open(log_path(username), "rb+") as log:
+        end = log.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - 4096)
+            log.seek(start)
+            cut = log.read(end - start).rfind(b"\n")
+            if cut != -1:
+                log.truncate(start + cut + 1)
+                return
+            end = start
+        log.truncate(0)
+
+def _index_is_consistent(username):
+    """Cheap check that the last index entry ends exactly at the end of the log"""
+    log_size = os.path.getsize(log_path(username))
+    if not os.path.exists(index_path(username)):
+        return False
+    idx_size = os.path.getsize(index_path(username))
+    if idx_size % INDEX_ENTRY_SIZE:
+        return False
+    if idx_size == 0:
+        return log_size == 0
+    with open(index_path(username), "rb") as idx:
+        idx.seek(idx_size - INDEX_ENTRY_SIZE)
+        offset, length = map(int, idx.read(INDEX_ENTRY_SIZE).split())
+    return offset + length == log_size
+
+
+def _legacy_to_deltas(all_data):
+    """Turn a list of full snapshots into delta records.
+
+    Autosave used to append a fresh copy of the whole transcript every time, so
+    consecutive snapshots whose messages extend the previous one are folded
+    into a single conversation.
+    """
+    records, names = [], {}
+    prev_messages, conversation_id = None, None
+    for i, chat in enumerate(all_data):
+        messages = chat.get("messages", [])
+        if prev_messages is not None and messages[:len(prev_messages)] == prev_messages:
+            base = len(prev_messages)
+        else:
+            conversation_id, base = f"legacy-{i}", 0
+        if base == len(messages) and records and chat.get("traits", {}) == records[-1]["traits"]:
+            continue
+        record = {
+            "conversation_id": conversation_id,
+            "timestamp": chat.get("timestamp"),
+            "base": base,
+            "messages": messages[base:],
+            "traits": chat.get("traits", {}),
+        }
+        for key in ("reactions", "advice_points"):
+            if key in chat:
+                record[key] = chat[key]
+        if "display_name" in chat:
+            names[conversation_id] = chat["display_name"]
+        records.append(record)
+        prev_messages = messages
+    return records, names
+
+def import_legacy_chats(username):
+    """Copy an old <user>_chats.json list into the log. Returns the number imported."""
+    path = legacy_path(username)
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r") as f:
+        all_data = json.load(f)
+    records, names = _legacy_to_deltas(all_data)
+    last_offsets = {}
+    for record in records:
+        if record["conversation_id"] in last_offsets:
+            record["prev"] = last_offsets[record["conversation_id"]]
+        last_offsets[record["conversation_id"]] = _append(username, record)
+    if names:
+        safe_io.atomic_write(names_path(username), json.dumps(names))
+    return len(all_data)
+
+def _store_is_usable(username):
+    return (os.path.exists(log_path(username)) and not _has_torn_tail(username)
+            and _index_is_consistent(username))
+
+def ensure_store(username):
+    """Make sure the log exists (importing legacy data) and its index is usable.
+
+    The checks run without the lock; a writer in the middle of an append can
+    make them fail, so repairs happen only after re-checking under the lock.
+    """
+    if _store_is_usable(username):
+        return
+    os.makedirs(USERDATA_DIR, exist_ok=True)
+    with _locked(username):
+        if not os.path.exists(log_path(username)):
+            open(log_path(username), "ab").close()
+            if os.path.exists(index_path(username)):
+                os.remove(index_path(username))
+            import_legacy_chats(username)
+        _truncate_torn_tail(username)
+        if not _index_is_consistent(username):
+            _rebuild_index(username)
+
+
+# ======================
+# PUBLIC API
+# ======================
+def append_chat(username, record):
+    """Append one saved chat record. O(1) in the size of existing history."""
+    ensure_store(username)
+    with _locked(username):
+        _append(username, record)
+
+def count_chats(username):
+    """Number of saved records, read from the index size"""
+    ensure_store(username)
+    return os.path.getsize(index_path(username)) // INDEX_ENTRY_SIZE
+
+def read_chat(username, n):
+    """Read a single record by position (negative positions count from the end)"""
+    total = count_chats(username)
+    if n < 0:
+        n += total
+    if not 0 <= n < total:
+        raise IndexError(f"chat {n} out of range")
+    with open(index_path(username), "rb") as idx:
+        idx.seek(n * INDEX_ENTRY_SIZE)
+        offset, length = map(int, idx.read(INDEX_ENTRY_SIZE).split())
+    with open(log_path(username), "rb") as log:
+        log.seek(offset)
+        return json.loads(log.read(length))
+
+def iter_chats(username):
+    """Yield every saved record in order"""
+    ensure_store(username)
+    with open(log_path(username), "rb") as log:
+        for line in log:
+            if line.endswith(b"\n"):
+                yield json.loads(line)
+
+def append_delta(username, conversation_id, base, messages, traits, reactions=None, previous_traits=None):
+    """Append the messages added to a conversation since its last save.
+
+    The difference between traits and the traits the conversation was last
+    saved with is folded into the user's running trait totals. Those stored
+    traits are read back from the log; previous_traits is accepted for
+    interface parity and not trusted. Raises safe_io.Conflict if base isn't
+    the number of messages already saved for the conversation, and
+    ValueError if traits doesn't map names to integers; either way nothing
+    is written.
+    """
+    if not isinstance(traits, dict) or not all(_is_trait_value(v) for v in traits.values()):
+        raise ValueError("traits must map trait names to integers")
+    record = {
+        "conversation_id": conversation_id,
+        "timestamp": datetime.now().isoformat(),
+        "base": base,
+        "messages": messages,
+        "traits": traits,
+    }
+    if reactions:
+        record["reactions"] = reactions
+    with _locked(username):
+        prepared = _prepare_append(username, record)
+        previous_traits = _valid_traits(prepared[2])
+        totals = trait_totals(username)
+        for trait in set(traits) | set(previous_traits):
+            totals[trait] = totals.get(trait, 0) + traits.get(trait, 0) - previous_traits.get(trait, 0)
+        _append_to_conversation(username, record, prepared)
+        _write_trait_totals(username, totals, count_chats(username))
+
+def append_rescore(username, conversation_id, message_count, traits, advice_points):
+    """Record recomputed traits/advice for a conversation without adding messages.
+
+    Raises safe_io.Conflict if messages were saved since message_count was read.
+    """
+    with _locked(username):
+        _append_to_conversation(username, {
+            "conversation_id": conversation_id,
+            "timestamp": datetime.now().isoformat(),
+            "base": message_count,
+            "messages": [],
+            "traits": traits,
+            "advice_points": advice_points,
+            "rescored": True,
+        })
+
+def _apply_record(convo, record):
+    """Fold one delta record into a conversation being rebuilt"""
+    base = record.get("base", 0)
+    convo["messages"][base:] = record.get("messages", [])
+    if not record.get("rescored"):
+        convo["updated_at"] = record.get("timestamp")
+    for key in ("traits", "reactions", "advice_points", "display_name"):
+        if key in record:
+            convo[key] = record[key]
+
+def _new_conversation(conversation_id, record):
+    return {
+        "conversation_id": conversation_id,
+        "timestamp": record.get("timestamp"),
+        "messages": [],
+    }
+
+def load_conversations(username):
+    """Rebuild full transcripts from delta records, in order of first save"""
+    conversations = {}
+    for n, record in enumerate(iter_chats(username)):
+        conversation_id = record.get("conversation_id", str(n))
+        convo = conversations.get(conversation_id)
+        if convo is None:
+            convo = conversations[conversation_id] = _new_conversation(conversation_id, record)
+        _apply_record(convo, record)
+    for entry in _read_slots(username, 0, count_conversations(username)):
+        if entry["display_name"] and entry["conversation_id"] in conversations:
+            conversations[entry["conversation_id"]]["display_name"] = entry["display_name"]
+    return list(conversations.values())
+
+def load_names(username):
+    """Display names from the pre-index <user>_chat_names.json, keyed by conversation id"""
+    if not os.path.exists(names_path(username)):
+        return {}
+    with open(names_path(username), "r") as f:
+        return json.load(f)
+
+
+# ======================
+# CONVERSATION INDEX
+# ======================
+# <user>_convos.idx holds one fixed-width slot per conversation, in order of
+# first save: id, first and latest save time, message count, log offset of
+# its latest record and display name. The first slot-sized line is a header
+# with the number of log records the slots cover; if that doesn't match the
+# log the whole file is rebuilt from it, like the trait totals.
+#
+# Listing a page of conversations reads a few contiguous slots, renaming
+# rewrites one slot in place, and load_conversation() follows the "prev"
+# chain back from the slot's offset. All of these cost the same however much
+# history the user has.
+#
+# Logs written before records were chained are rewritten once, with their
+# "prev" offsets filled in, the first time the index is built for them.
+CONVO_FIELDS = (
+    ("conversation_id", 40),
+    ("timestamp", 32),
+    ("updated_at", 32),
+    ("message_count", 8),
+    ("last_offset", 12),
+    ("display_name", 120),
+)
+CONVO_SLOT_SIZE = sum(width for _, width in CONVO_FIELDS) + 1
+CONVO_HEADER = "records {:012d}"
+
+# username -> {conversation_id: slot number}; slots are only ever appended,
+# so the map is extended from the file rather than re-read
+_slot_numbers = {}
+
+def convos_path(username):
+    """Path of the fixed-width conversation index"""
+    return _user_file(username, "_convos.idx")
+
+def _fit(text, width):
+    """UTF-8 bytes of text cut to width on a character boundary"""
+    raw = (text or "").encode("utf-8")[:width]
+    return raw.decode("utf-8", "ignore").encode("utf-8")
+
+def _encode_slot(entry):
+    parts = []
+    for name, width in CONVO_FIELDS:
+        value = entry.get(name)
+        if name in ("message_count", "last_offset"):
+            parts.append(str(value).zfill(width).encode("ascii"))
+        else:
+            raw = _fit(value, width)
+            if name == "conversation_id" and raw.decode("utf-8") != value:
+                raise ValueError(f"conversation id too long for the index: {value!r}")
+            parts.append(raw.ljust(width, b" "))
+    return b"".join(parts) + b"\n"
+
+def _decode_slot(raw):
+    entry, pos = {}, 0
+    for name, width in CONVO_FIELDS:
+        field = raw[pos:pos + width]
+        pos += width
+        if name in ("message_count", "last_offset"):
+            entry[name] = int(field)
+        else:
+            entry[name] = field.decode("utf-8", "ignore").rstrip(" ") or None
+    return entry
+
+def _encode_header(records):
+    return CONVO_HEADER.format(records).encode("ascii").ljust(CONVO_SLOT_SIZE - 1, b" ") + b"\n"
+
+def _header_records(username):
+    try:
+        with open(convos_path(username), "rb") as f:
+            header = f.read(CONVO_SLOT_SIZE)
+        if len(header) != CONVO_SLOT_SIZE or os.path.getsize(convos_path(username)) % CONVO_SLOT_SIZE:
+            return None
+        return int(header.split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _chain_log(username):
+    """Rewrite the log with every record's "prev" offset filled in"""
+    lines, last_offsets, offset = [], {}, 0
+    with open(log_path(username), "rb") as log:
+        for n, line in enumerate(log):
+            if not line.endswith(b"\n"):
+                break
+            record = json.loads(line)
+            conversation_id = record.get("conversation_id", str(n))
+            record.pop("prev", None)
+            if conversation_id in last_offsets:
+                record["prev"] = last_offsets[conversation_id]
+            line = _encode(record)
+            last_offsets[conversation_id] = offset
+            offset += len(line)
+            lines.append(line)
+    safe_io.atomic_write(log_path(username), b"".join(lines))
+    _rebuild_index(username)
+
+def _rebuild_convo_index(username):
+    """Recreate the conversation index from the log, keeping display names"""
+    names = load_names(username)
+    if _header_records(username) is not None:
+        for entry in _read_slots(username, 0, os.path.getsize(convos_path(username)) // CONVO_SLOT_SIZE - 1):
+            if entry["display_name"]:
+                names[entry["conversation_id"]] = entry["display_name"]
+    entries = {}
+    offset = 0
+    records = 0
+    unchained = False
+    with open(log_path(username), "rb") as log:
+        for line in log:
+            if not line.endswith(b"\n"):
+                break
+            record = json.loads(line)
+            conversation_id = record.get("conversation_id", str(records))
+            entry = entries.get(conversation_id)
+            if entry is not None and record.get("prev") != entry["last_offset"]:
+                unchained = True
+                break
+            if entry is None:
+                entry = entries[conversation_id] = {
+                    "conversation_id": conversation_id,
+                    "timestamp": record.get("timestamp"),
+                    "display_name": names.get(conversation_id) or record.get("display_name"),
+                }
+            if not record.get("rescored"):
+                entry["updated_at"] = record.get("timestamp")
+            entry["message_count"] = record.get("base", 0) + len(record.get("messages", []))
+            entry["last_offset"] = offset
+            offset += len(line)
+            records += 1
+    if unchained:
+        _chain_log(username)
+        return _rebuild_convo_index(username)
+    safe_io.atomic_write(
+        convos_path(username),
+        _encode_header(records) + b"".join(_encode_slot(entry) for entry in entries.values())
+    )
+    _slot_numbers.pop(username, None)
+
+def _convo_index_is_current(username):
+    return _header_records(username) == os.path.getsize(index_path(username)) // INDEX_ENTRY_SIZE
+
+def ensure_convo_index(username):
+    """Make sure the conversation index covers every record in the log"""
+    ensure_store(username)
+    if not _convo_index_is_current(username):
+        with _locked(username):
+            ensure_store(username)
+            if not _convo_index_is_current(username):
+                _rebuild_convo_index(username)
+
+def _read_slots(username, start, stop):
+    """Decoded slots [start, stop) in one read"""
+    if stop <= start:
+        return []
+    with open(convos_path(username), "rb") as f:
+        f.seek((start + 1) * CONVO_SLOT_SIZE)
+        raw = f.read((stop - start) * CONVO_SLOT_SIZE)
+    return [_decode_slot(raw[i:i + CONVO_SLOT_SIZE]) for i in range(0, len(raw), CONVO_SLOT_SIZE)]
+
+def _find_slot(username, conversation_id):
+    """Slot number of a conversation, or None"""
+    known = _slot_numbers.get(username)
+    total = count_conversations(username)
+    if known is None or len(known) > total:
+        known = _slot_numbers[username] = {}
+    if len(known) < total:
+        for n, entry in enumerate(_read_slots(username, len(known), total), start=len(known)):
+            known[entry["conversation_id"]] = n
+    return known.get(conversation_id)
+
+def _write_slot(username, n, entry, records=None):
+    with open(convos_path(username), "rb+") as f:
+        f.seek((n + 1) * CONVO_SLOT_SIZE)
+        f.write(_encode_slot(entry))
+        if records is not None:
+            f.seek(0)
+            f.write(_encode_header(records))
+
+def _prepare_append(username, record):
+    """Chain a record to its conversation and check it against the index.
+
+    Callers hold the user's lock. The conversation's saved message count is
+    its version: the record's base must match it. Returns (slot number, slot
+    entry, traits the conversation was saved with before this record, {} for
+    a new one) for _append_to_conversation().
+    """
+    ensure_convo_index(username)
+    conversation_id = record["conversation_id"]
+    n = _find_slot(username, conversation_id)
+    if n is None:
+        saved, previous_traits = 0, {}
+        n = count_conversations(username)
+        entry = {"conversation_id": conversation_id, "timestamp": record["timestamp"], "display_name": None}
+    else:
+        entry = _read_slots(username, n, n + 1)[0]
+        saved = entry["message_count"]
+        record["prev"] = entry["last_offset"]
+        with open(log_path(username), "rb") as log:
+            previous_traits = _stored_traits(log, entry["last_offset"])
+    if record["base"] != saved:
+        raise safe_io.Conflict(
+            f"conversation {conversation_id} has {saved} saved messages, not {record['base']}"
+        )
+    return n, entry, previous_traits
+
+def _append_to_conversation(username, record, prepared=None):
+    """Append a record and update the conversation index (see _prepare_append)"""
+    n, entry, _ = prepared or _prepare_append(username, record)
+    entry["last_offset"] = _append(username, record)
+    entry["message_count"] = record["base"] + len(record["messages"])
+    if not record.get("rescored"):
+        entry["updated_at"] = record["timestamp"]
+    _write_slot(username, n, entry, os.path.getsize(index_path(username)) // INDEX_ENTRY_SIZE)
+    _slot_numbers.setdefault(username, {})[record["conversation_id"]] = n
+
+def count_conversations(username):
+    """Number of distinct conversations, read from the index size"""
+    ensure_convo_index(username)
+    return os.path.getsize(convos_path(username)) // CONVO_SLOT_SIZE - 1
+
+def list_conversations(username, offset=0, limit=20):
+    """One page of conversation metadata, newest first.
+
+    Each entry has conversation_id, display_name, timestamp (first save),
+    updated_at, message_count and number (1-based position in save order).
+    """
+    total = count_conversations(username)
+    stop = max(0, total - offset)
+    start = max(0, stop - limit)
+    entries = _read_slots(username, start, stop)
+    for n, entry in enumerate(entries, start=start):
+        entry["number"] = n + 1
+        del entry["last_offset"]
+    return entries[::-1]
+
+def conversation_entries(username, conversation_ids):
+    """Metadata like list_conversations() for specific conversations, in the given order"""
+    entries = []
+    for conversation_id in conversation_ids:
+        n = _find_slot(username, conversation_id)
+        if n is None:
+            continue
+        entry = _read_slots(username, n, n + 1)[0]
+        entry["number"] = n + 1
+        del entry["last_offset"]
+        entries.append(entry)
+    return entries
+
+def _read_record_at(log, offset):
+    log.seek(offset)
+    return json.loads(log.readline())
+
+def _stored_traits(log, offset):
+    """Latest traits of the conversation whose newest record is at offset"""
+    while offset is not None:
+        record = _read_record_at(log, offset)
+        if "traits" in record:
+            return record["traits"]
+        offset = record.get("prev")
+    return {}
+
+def conversation_traits(username, conversation_id):
+    """The traits a conversation was last saved with, or None if it was never saved"""
+    n = _find_slot(username, conversation_id)
+    if n is None:
+        return None
+    offset = _read_slots(username, n, n + 1)[0]["last_offset"]
+    with open(log_path(username), "rb") as log:
+        return _stored_traits(log, offset)
+
+def load_conversation(username, conversation_id):
+    """Rebuild a single transcript by following its "prev" chain, or None if unknown"""
+    n = _find_slot(username, conversation_id)
+    if n is None:
+        return None
+    entry = _read_slots(username, n, n + 1)[0]
+    chain = []
+    with open(log_path(username), "rb") as log:
+        offset = entry["last_offset"]
+        while offset is not None:
+            record = _read_record_at(log, offset)
+            chain.append(record)
+            offset = record.get("prev")
+    convo = _new_conversation(conversation_id, chain[-1])
+    for record in reversed(chain):
+        _apply_record(convo, record)
+    if entry["display_name"]:
+        convo["display_name"] = entry["display_name"]
+    return convo
+
+def rename_chat(username, conversation_id, display_name):
+    """Set a display name by rewriting the conversation's index slot in place"""
+    with _locked(username):
+        n = _find_slot(username, conversation_id)
+        if n is None:
+            return
+        entry = _read_slots(username, n, n + 1)[0]
+        entry["display_name"] = display_name
+        _write_slot(username, n, entry)
+
+
+# ======================
+# RUNNING TRAIT TOTALS
+# ======================
+# <user>_traits.json holds the sum of each conversation's latest trait
+# snapshot plus the number of log records it covers. If that count doesn't
+# match the log (crash between the two writes, imported data, old files) the
+# totals are rebuilt from the log.
+def traits_path(username):
+    """Path of the per-user running trait totals"""
+    return _user_file(username, "_traits.json")
+
+def _write_trait_totals(username, totals, records):
+    safe_io.atomic_write(traits_path(username), json.dumps({"records": records, "totals": totals}))
+
+def _is_trait_value(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _valid_traits(traits):
+    """The well-formed part of a stored traits snapshot; records saved before
+    traits were checked may hold anything"""
+    if not isinstance(traits, dict):
+        return {}
+    return {trait: value for trait, value in traits.items() if _is_trait_value(value)}
+
+def rebuild_trait_totals(username):
+    """Recompute totals from raw history, counting each conversation once"""
+    with _locked(username):
+        totals = {}
+        for convo in load_conversations(username):
+            for trait, value in _valid_traits(convo.get("traits")).items():
+                totals[trait] = totals.get(trait, 0) + value
+        _write_trait_totals(username, totals, count_chats(username))
+    return totals
+
+def _current_trait_totals(username):
+    try:
+        with open(traits_path(username), "r") as f:
+            state = json.load(f)
+        if state["records"] == count_chats(username):
+            return state["totals"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+def trait_totals(username):
+    """Running trait totals across all saved conversations. O(1) when up to date."""
+    totals = _current_trait_totals(username)
+    if totals is None:
+        with _locked(username):
+            totals = _current_trait_totals(username)
+            if totals is None:
+                totals = rebuild_trait_totals(username)
+    return totals
+
+
+if __name__ == "__main__":
+    # Import every legacy <user>_chats.json under USERDATA_DIR
+    for filename in sorted(os.listdir(USERDATA_DIR)):
+        if filename.endswith("_chats.json"):
+            user = filename[:-len("_chats.json")]
+            existed = os.path.exists(log_path(user))
+            ensure_store(user)
+            status = "already imported" if existed else f"imported {count_chats(user)} chats"
+            print(f"{user}: {status}")
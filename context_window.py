@@ -0,0 +1,88 @@
+# ======================
+# CONTEXT WINDOW BUILDER
+# ======================
+# Decides which part of a conversation is sent with each reply. Instead of a
+# fixed number of messages, recent turns are packed newest-first into a token
+# budget (MINDLY_CONTEXT_TOKENS), so prompt size, latency and cost stay
+# predictable however long the messages are. Turns that no longer fit are
+# represented by a rolling summary maintained in chat_engine.
+#
+# Token counts are a local estimate (about four characters per token for
+# words, one per symbol), close enough to budget with and free to compute.
+
+import os
+import re
+
+CONTEXT_TOKENS = int(os.environ.get("MINDLY_CONTEXT_TOKENS", "1500"))
+# Role markers and separators the API adds around every chat message
+MESSAGE_OVERHEAD = 4
+
+_PIECES = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def estimate_tokens(text):
+    """Approximate BPE token count of text"""
+    return sum((len(piece) + 3) // 4 for piece in _PIECES.findall(text))
+
+def message_tokens(message):
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+def truncate_to_tokens(text, budget, keep="end"):
+    """Cut text to roughly budget tokens, keeping its end (or its start)"""
+    if estimate_tokens(text) <= budget:
+        return text
+    pieces = list(_PIECES.finditer(text))
+    if keep == "start":
+        used, cut = 0, 0
+        for piece in pieces:
+            used += (len(piece.group()) + 3) // 4
+            if used > budget:
+                break
+            cut = piece.end()
+        return text[:cut].rstrip() + "…"
+    used, cut = 0, len(text)
+    for piece in reversed(pieces):
+        used += (len(piece.group()) + 3) // 4
+        if used > budget:
+            break
+        cut = piece.start()
+    return "…" + text[cut:].lstrip()
+
+
+def pack(messages, budget):
+    """The longest run of trailing messages that fits budget.
+
+    Returns (start, window): window holds copies of messages[start:]. The
+    last message is always included, truncated if it alone is too long.
+    Leading assistant turns are dropped so the window opens with the user.
+    """
+    used, start = 0, len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        cost = message_tokens(messages[i])
+        if used + cost > budget:
+            break
+        used += cost
+        start = i
+    if start == len(messages):
+        if not messages:
+            return 0, []
+        last = messages[-1]
+        content = truncate_to_tokens(last["content"], max(budget - MESSAGE_OVERHEAD, 1))
+        return len(messages) - 1, [{"role": last["role"], "content": content}]
+    while start < len(messages) - 1 and messages[start]["role"] == "assistant":
+        start += 1
+    return start, [{"role": m["role"], "content": m["content"]} for m in messages[start:]]
+
+def build(system_prompt, messages, summary=None, budget=CONTEXT_TOKENS):
+    """Chat messages for the API: one system message (instructions plus the
+    summary of older turns, if any) followed by the recent turns that fit.
+
+    Returns (start, convo) where start is the index in messages of the first
+    turn sent verbatim.
+    """
+    system = system_prompt
+    if summary:
+        system += f"\n\nSummary of the earlier conversation:\n{summary}"
+    head = {"role": "system", "content": system}
+    start, window = pack(messages, budget - message_tokens(head))
+    return start, [head] + window
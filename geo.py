@@ -0,0 +1,245 @@
+# ======================
+# COUNTRY DETECTION & CRISIS RESOURCES
+# ======================
+# Resolves which country's crisis lines the Quick Help panel shows, without
+# ever blocking a page render on the network:
+#
+#   1. the client's IP (from X-Forwarded-For behind MINDLY_TRUSTED_PROXIES
+#      proxies, else the socket peer) is looked up in a local IP-range
+#      table (MINDLY_GEOIP_PATH)
+#   2. if the table is missing or has no match, the IP is looked up online
+#      (ipapi.co) on a background thread; this render shows the
+#      international resources and a later one picks up the answer. At most
+#      MINDLY_GEO_MAX_PENDING lookups wait; past that new ones are dropped
+#      and asked for again on a later render
+#
+# Each proxy appends the address it received the request from to
+# X-Forwarded-For, and anything to the left of that came from the client
+# and can be forged. So the client's IP is the address the outermost
+# trusted proxy saw: the MINDLY_TRUSTED_PROXIES-th entry from the right.
+#
+# The IP-range table is a compact binary file of fixed-width, sorted
+# records searched in place with bisect over an mmap, so it costs no start-up
+# time and almost no memory however large it is. Build it from any
+# "start,end,country" CSV (IPs dotted or as integers), e.g. DB-IP's free
+# "IP to Country Lite" download:
+#
+#   python geo.py build dbip-country-lite.csv
+
+import argparse
+import bisect
+import csv
+import ipaddress
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import safe_io
+from crisis_resources import CRISIS_RESOURCES
+
+GEOIP_PATH = os.environ.get("MINDLY_GEOIP_PATH", os.path.join("config", "ip_country.bin"))
+ONLINE_LOOKUP = os.environ.get("MINDLY_GEO_ONLINE", "1") != "0"
+ONLINE_URL = "https://ipapi.co/{ip}/json/"
+CACHE_SIZE = int(os.environ.get("MINDLY_GEO_CACHE_SIZE", "10000"))
+MAX_PENDING = int(os.environ.get("MINDLY_GEO_MAX_PENDING", "100"))
+# Reverse proxies in front of the app that append to X-Forwarded-For
+TRUSTED_PROXIES = int(os.environ.get("MINDLY_TRUSTED_PROXIES", "1"))
+
+# Header: magic, IPv4 record count, IPv6 record count. Then the IPv4
+# records (start, end, country) followed by the IPv6 ones, each sorted by
+# start. Ranges don't overlap.
+MAGIC = b"MINDLYG1"
+HEADER = struct.Struct(">8sII")
+RECORD_WIDTHS = {4: 4, 6: 16}
+
+
+# ======================
+# IP-RANGE TABLE
+# ======================
+class _Starts:
+    """Read-only sequence of range starts in one section of the table, for bisect"""
+
+    def __init__(self, buf, offset, count, width):
+        self.buf, self.offset, self.count, self.width = buf, offset, count, width
+        self.size = 2 * width + 2
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        at = self.offset + i * self.size
+        return int.from_bytes(self.buf[at:at + self.width], "big")
+
+    def record(self, i):
+        at = self.offset + i * self.size + self.width
+        end = int.from_bytes(self.buf[at:at + self.width], "big")
+        return end, self.buf[at + self.width:at + self.width + 2].decode("ascii")
+
+
+@lru_cache(maxsize=2)
+def _table(path, signature):
+    """{4: _Starts, 6: _Starts} for the file at path; signature keys the cache on mtime/size"""
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, count4, count6 = HEADER.unpack_from(buf)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not an IP-range table (build one with: python geo.py build ...)")
+    offset6 = HEADER.size + count4 * (2 * RECORD_WIDTHS[4] + 2)
+    return {
+        4: _Starts(buf, HEADER.size, count4, RECORD_WIDTHS[4]),
+        6: _Starts(buf, offset6, count6, RECORD_WIDTHS[6]),
+    }
+
+def lookup_local(ip, path=None):
+    """Country code for ip from the local table, or None"""
+    path = path or GEOIP_PATH
+    try:
+        st = os.stat(path)
+        sections = _table(path, (st.st_mtime_ns, st.st_size))
+    except (OSError, ValueError):
+        return None
+    address = ipaddress.ip_address(ip)
+    starts = sections[address.version]
+    value = int(address)
+    i = bisect.bisect_right(starts, value) - 1
+    if i < 0:
+        return None
+    end, code = starts.record(i)
+    return code if value <= end else None
+
+def build_table(rows, path):
+    """Write (start, end, country) rows to a table file. Returns the record count."""
+    sections = {4: [], 6: []}
+    for start, end, code in rows:
+        start, end = ipaddress.ip_address(start), ipaddress.ip_address(end)
+        if start.version != end.version or len(code) != 2 or code == "ZZ":
+            continue
+        sections[start.version].append((int(start), int(end), code.upper()))
+    out = [HEADER.pack(MAGIC, len(sections[4]), len(sections[6]))]
+    for version, records in sections.items():
+        width = RECORD_WIDTHS[version]
+        for start, end, code in sorted(records):
+            out.append(start.to_bytes(width, "big") + end.to_bytes(width, "big") + code.encode("ascii"))
+    safe_io.atomic_write(path, b"".join(out))
+    return len(sections[4]) + len(sections[6])
+
+
+def _csv_rows(path):
+    with open(path, newline="") as f:
+        for row in csv.reader(f):
+            if len(row) < 3 or row[0].startswith("#"):
+                continue
+            start, end, code = row[0].strip(), row[1].strip(), row[2].strip()
+            if start.isdigit():
+                start, end = int(start), int(end)
+            yield start, end, code
+
+
+# ======================
+# DETECTION
+# ======================
+# ip -> country code (or None when the lookup found nothing), shared by all
+# sessions in the process
+_resolved = OrderedDict()
+_resolved_lock = threading.Lock()
+_pending = set()
+_lookups = ThreadPoolExecutor(max_workers=2, thread_name_prefix="geo")
+
+def client_ip(headers, peer_ip=None, trusted_proxies=None):
+    """The end user's public IP: the X-Forwarded-For entry added by the
+    outermost trusted proxy, else the peer address"""
+    trusted_proxies = TRUSTED_PROXIES if trusted_proxies is None else trusted_proxies
+    candidates = []
+    forwarded = (headers or {}).get("X-Forwarded-For")
+    if forwarded and trusted_proxies > 0:
+        hops = [hop.strip() for hop in forwarded.split(",")]
+        if len(hops) >= trusted_proxies:
+            candidates.append(hops[-trusted_proxies])
+    candidates.append(peer_ip)
+    for candidate in candidates:
+        try:
+            address = ipaddress.ip_address(candidate)
+        except (TypeError, ValueError):
+            continue
+        if address.is_global:
+            return str(address)
+    return None
+
+def _remember(ip, code):
+    with _resolved_lock:
+        _resolved[ip] = code
+        _resolved.move_to_end(ip)
+        while len(_resolved) > CACHE_SIZE:
+            _resolved.popitem(last=False)
+        _pending.discard(ip)
+
+def _lookup_online(ip):
+    import llm_client
+    try:
+        code = llm_client.get_json(ONLINE_URL.format(ip=ip)).get("country_code")
+    except Exception:
+        code = None
+    _remember(ip, code)
+
+def detect_country(ip):
+    """(done, code): code is an ISO alpha-2 code or None. Never blocks on the network.
+
+    done is False while an online lookup for ip is still running, or when
+    too many are queued to start one; ask again on a later rerun.
+    """
+    if ip is None:
+        return True, None
+    with _resolved_lock:
+        if ip in _resolved:
+            return True, _resolved[ip]
+        if ip in _pending:
+            return False, None
+    code = lookup_local(ip)
+    if code or not ONLINE_LOOKUP:
+        _remember(ip, code)
+        return True, code
+    with _resolved_lock:
+        if ip in _pending or len(_pending) >= MAX_PENDING:
+            return False, None
+        _pending.add(ip)
+    _lookups.submit(_lookup_online, ip)
+    return False, None
+
+
+# ======================
+# COUNTRIES & RESOURCES
+# ======================
+@lru_cache(maxsize=1)
+def country_index():
+    """(names, name -> alpha_2): every country for the picker, built once per process"""
+    import pycountry
+    index = {c.name: c.alpha_2 for c in pycountry.countries}
+    return tuple(index), index
+
+@lru_cache(maxsize=None)
+def resources_for(code):
+    """(icon, ((service, number), ...)) for a country code, falling back to international"""
+    resources = CRISIS_RESOURCES.get(code) or CRISIS_RESOURCES["default"]
+    return resources.get("icon", ""), tuple((k, v) for k, v in resources.items() if k != "icon")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the local IP-to-country table")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="convert a start,end,country CSV")
+    build.add_argument("csv")
+    build.add_argument("--out", default=GEOIP_PATH)
+    query = sub.add_parser("lookup", help="look up IP addresses")
+    query.add_argument("ips", nargs="+")
+    query.add_argument("--table", default=GEOIP_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(f"wrote {build_table(_csv_rows(args.csv), args.out)} ranges to {args.out}")
+    else:
+        for ip in args.ips:
+            print(f"{ip}: {lookup_local(ip, args.table) or 'unknown'}")
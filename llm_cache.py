@@ -0,0 +1,111 @@
+# ======================
+# PERSISTENT LLM RESULT CACHE
+# ======================
+# Content-addressed cache for deterministic-enough LLM calls (advice
+# refinement, profile summaries). Keys are a SHA-256 of (model, prompt
+# template, input, temperature); values live in a small SQLite file so every
+# session and every server process shares them. Entries expire after a TTL
+# and the least recently used ones are evicted once the cache exceeds its
+# size budget.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = os.environ.get("MINDLY_LLM_CACHE_PATH", os.path.join("userdata", "llm_cache.db"))
+TTL_SECONDS = int(os.environ.get("MINDLY_LLM_CACHE_TTL", str(30 * 24 * 3600)))
+MAX_BYTES = int(os.environ.get("MINDLY_LLM_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+ENABLED = os.environ.get("MINDLY_LLM_CACHE", "1") != "0"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key         TEXT PRIMARY KEY,
+    value       TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache(last_access);
+"""
+
+_local = threading.local()
+
+
+def _conn():
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != CACHE_PATH:
+        os.makedirs(os.path.dirname(CACHE_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(CACHE_PATH, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        _local.conn, _local.path = conn, CACHE_PATH
+    return conn
+
+
+def make_key(model, template, input_text, temperature):
+    """Stable hash of everything that determines the completion"""
+    material = json.dumps([model, template, input_text, temperature], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+def get(key):
+    """Cached value or None; refreshes the entry's LRU position"""
+    if not ENABLED:
+        return None
+    conn = _conn()
+    row = conn.execute("SELECT value, created_at FROM cache WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return None
+    now = time.time()
+    with conn:
+        if now - row[1] > TTL_SECONDS:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE cache SET last_access = ? WHERE key = ?", (now, key))
+    return row[0]
+
+def put(key, value):
+    if not ENABLED:
+        return
+    now = time.time()
+    size = len(value.encode("utf-8")) + len(key)
+    conn = _conn()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+            (key, value, size, now, now)
+        )
+    evict()
+
+def evict():
+    """Drop expired entries, then least recently used ones until under MAX_BYTES"""
+    conn = _conn()
+    with conn:
+        conn.execute("DELETE FROM cache WHERE created_at < ?", (time.time() - TTL_SECONDS,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= MAX_BYTES:
+            return
+        target = total - int(MAX_BYTES * 0.9)
+        freed = 0
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM cache ORDER BY last_access"):
+            doomed.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        conn.executemany("DELETE FROM cache WHERE key = ?", doomed)
+
+def cached_call(model, template, input_text, temperature, compute):
+    """Return the cached result for these inputs, or compute and store it.
+
+    Exceptions from compute propagate and nothing is cached, so fallbacks
+    never get pinned.
+    """
+    key = make_key(model, template, input_text, temperature)
+    value = get(key)
+    if value is None:
+        value = compute()
+        put(key, value)
+    return value
@@ -0,0 +1,204 @@
+# ======================
+# OPENROUTER CLIENT
+# ======================
+# Wrapper around the OpenRouter chat completions endpoint with both a
+# blocking call and a streaming (server-sent events) call. All requests go
+# through one pooled keep-alive session so repeat calls skip the TCP/TLS
+# handshake. The base URL can be pointed at a local stub with
+# OPENROUTER_BASE_URL, e.g.
+#   python benchmarks/fake_openrouter.py --port 8765
+#   OPENROUTER_BASE_URL=http://127.0.0.1:8765/api/v1 streamlit run chatbottherapy.py
+
+import json
+import os
+import random
+import threading
+import time
+
+import metrics
+
+BASE_URL = os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+DEFAULT_MODEL = "anthropic/claude-3-haiku"
+
+# Connection pool shared by every session in the process
+POOL_SIZE = int(os.environ.get("MINDLY_HTTP_POOL_SIZE", "20"))
+# Retries on connection errors, 429 and 5xx, with exponential backoff + full jitter
+MAX_RETRIES = int(os.environ.get("MINDLY_HTTP_RETRIES", "2"))
+BACKOFF_BASE = float(os.environ.get("MINDLY_HTTP_BACKOFF", "0.5"))
+BACKOFF_CAP = 8.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# (connect, read) timeouts in seconds per endpoint
+TIMEOUTS = {
+    "chat": (5, 20),
+    "refine": (5, 10),
+    "summary": (5, 10),
+    "geo": (1, 2),
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def http_session():
+    """Process-wide keep-alive session, created on first use"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                # requests is imported on first use so pages that never call
+                # the API (e.g. login) don't pay for it
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+def _backoff(attempt):
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+def request_with_retries(method, url, **kwargs):
+    """Send a request on the shared session, retrying transient failures"""
+    import requests
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = http_session().request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == MAX_RETRIES:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                return response
+            retry_after = response.headers.get("Retry-After")
+            response.close()
+            if retry_after and retry_after.isdigit():
+                time.sleep(min(BACKOFF_CAP, int(retry_after)))
+                continue
+        time.sleep(_backoff(attempt))
+
+
+def completions_url():
+    return f"{BASE_URL.rstrip('/')}/chat/completions"
+
+def auth_headers(api_key):
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+
+def chat_completion(api_key, messages, model=DEFAULT_MODEL, endpoint="chat", **params):
+    """Blocking completion; returns the reply text"""
+    try:
+        response = request_with_retries(
+            "POST",
+            completions_url(),
+            headers=auth_headers(api_key),
+            json={"model": model, "messages": messages, **params},
+            timeout=TIMEOUTS[endpoint]
+        )
+        response.raise_for_status()
+        data = response.json()
+        reply = data['choices'][0]['message']['content'].strip()
+    except Exception as e:
+        metrics.llm_failed(endpoint, e)
+        raise
+    metrics.llm_succeeded(endpoint, messages, reply, data.get("usage"))
+    return reply
+
+def get_json(url, endpoint="geo"):
+    """GET a small JSON document over the shared pool (no retries)"""
+    response = http_session().get(url, timeout=TIMEOUTS[endpoint])
+    response.raise_for_status()
+    return response.json()
+
+
+class SSEDecoder:
+    """Incremental server-sent events parser: feed() one line at a time"""
+
+    def __init__(self):
+        self.data = []
+
+    def feed(self, line):
+        """Returns the payload of the event this line completes, or None"""
+        if line is None:
+            return None
+        if line == "":
+            if self.data:
+                payload, self.data = "\n".join(self.data), []
+                return payload
+        elif line.startswith(":"):
+            pass  # comment / keep-alive
+        elif line.startswith("data:"):
+            self.data.append(line[5:].lstrip(" "))
+        return None
+
+    def flush(self):
+        """Payload of a final event the stream ended without terminating"""
+        payload, self.data = ("\n".join(self.data) if self.data else None), []
+        return payload
+
+def iter_sse_data(lines):
+    """Yield the payload of each "data:" event from an iterable of SSE lines"""
+    decoder = SSEDecoder()
+    for line in lines:
+        payload = decoder.feed(line)
+        if payload is not None:
+            yield payload
+    payload = decoder.flush()
+    if payload is not None:
+        yield payload
+
+def content_deltas(payload):
+    """Text fragments carried by one SSE payload, or None for the [DONE] marker"""
+    if payload == "[DONE]":
+        return None
+    chunk = json.loads(payload)
+    if "error" in chunk:
+        raise RuntimeError(chunk["error"].get("message", "stream error"))
+    return [
+        content
+        for choice in chunk.get("choices", [])
+        if (content := (choice.get("delta") or {}).get("content"))
+    ]
+
+def iter_content_deltas(lines):
+    """Turn OpenRouter SSE lines into the text fragments of the reply"""
+    for payload in iter_sse_data(lines):
+        deltas = content_deltas(payload)
+        if deltas is None:
+            return
+        yield from deltas
+
+
+def stream_chat_completion(api_key, messages, model=DEFAULT_MODEL, endpoint="chat", **params):
+    """Streaming completion; yields text fragments as the server sends them.
+
+    The HTTP request is made when the generator is first advanced, so callers
+    can catch connection and status errors before anything is rendered.
+    Retries only happen before the first byte of the stream.
+    """
+    parts = []
+    try:
+        with request_with_retries(
+            "POST",
+            completions_url(),
+            headers=auth_headers(api_key),
+            json={"model": model, "messages": messages, "stream": True, **params},
+            timeout=TIMEOUTS[endpoint],
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            # SSE is always UTF-8; requests would otherwise guess ISO-8859-1
+            response.encoding = "utf-8"
+            for token in iter_content_deltas(response.iter_lines(decode_unicode=True)):
+                parts.append(token)
+                yield token
+    except Exception as e:
+        metrics.llm_failed(endpoint, e)
+        raise
+    metrics.llm_succeeded(endpoint, messages, "".join(parts))
@@ -0,0 +1,103 @@
+# ======================
+# IN-MEMORY TRANSCRIPT
+# ======================
+# A ChatSession's messages, kept small: each message is a two-slot record
+# (no per-message dict) with its role interned, and the oldest messages can
+# be dropped from memory ("spilled") once they are safely in storage. The
+# buffer keeps absolute positions, so buffer[i] and buffer[a:b] mean the
+# same message(s) before and after a spill; asking for a spilled position
+# raises Spilled and the caller reads it back from the repository.
+#
+# Messages also answer message["role"] / message.get("content"), so code
+# written against the old list of dicts keeps working.
+
+import sys
+
+
+class Spilled(IndexError):
+    """The requested messages were dropped from memory; load them from storage"""
+
+
+class Message:
+    __slots__ = ("role", "content")
+
+    def __init__(self, role, content):
+        self.role = sys.intern(role)
+        self.content = content
+
+    @classmethod
+    def coerce(cls, message):
+        return message if isinstance(message, cls) else cls(message["role"], message["content"])
+
+    def __getitem__(self, key):
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        if isinstance(other, (Message, dict)):
+            return self.role == other["role"] and self.content == other["content"]
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Message({self.role!r}, {self.content!r})"
+
+    def to_dict(self):
+        return {"role": self.role, "content": self.content}
+
+
+class MessageBuffer:
+    """The messages of one conversation; those before .offset live only in storage"""
+
+    __slots__ = ("offset", "_items")
+
+    def __init__(self, messages=(), offset=0):
+        self.offset = offset
+        self._items = [Message.coerce(m) for m in messages]
+
+    def __len__(self):
+        """Length of the whole conversation, spilled messages included"""
+        return self.offset + len(self._items)
+
+    def __iter__(self):
+        """The messages still in memory"""
+        return iter(self._items)
+
+    def _position(self, i):
+        if i < 0:
+            i += len(self)
+        if i < self.offset:
+            raise Spilled(f"message {i} was spilled to storage (in memory from {self.offset})")
+        return i - self.offset
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("MessageBuffer slices must be contiguous")
+            if stop <= start:
+                return []
+            return self._items[self._position(start):stop - self.offset]
+        return self._items[self._position(key)]
+
+    def append(self, message):
+        self._items.append(Message.coerce(message))
+
+    def spill(self, upto):
+        """Drop messages before absolute position upto from memory. Returns how many."""
+        count = max(0, min(upto, len(self)) - self.offset)
+        del self._items[:count]
+        self.offset += count
+        return count
+
+    def to_list(self):
+        """The in-memory messages as plain dicts (for JSON and storage)"""
+        return [m.to_dict() for m in self._items]
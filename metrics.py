@@ -0,0 +1,265 @@
+# ======================
+# METRICS & PROFILING
+# ======================
+# Lightweight instrumentation for the hot paths: timing spans (histograms of
+# seconds per named operation) and counters (LLM requests, tokens and
+# errors), exported in the Prometheus text format.
+#
+#   MINDLY_METRICS=1             turn spans and counters on (off by default)
+#   MINDLY_METRICS_FILE=path     also write the metrics to path every
+#                                MINDLY_METRICS_INTERVAL seconds (default 15)
+#                                and at exit; "{pid}" in the path is replaced
+#                                so several processes don't share one file.
+#                                Works with node_exporter's textfile collector.
+#   MINDLY_PROFILE_DIR=dir       cProfile every Streamlit rerun and dump it to
+#                                dir as <time>-<page>-<ms>ms.prof
+#
+# The HTTP API serves the same text at GET /metrics.
+#
+# When MINDLY_METRICS is off, timed() hands back the undecorated function
+# and span()/count() return at once, so instrumented code costs nothing
+# measurable. Read a profile dump with:
+#
+#   python metrics.py profile dumps/20260101-120000-Chat-840ms.prof [--top 25]
+
+import argparse
+import atexit
+import os
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+ENABLED = os.environ.get("MINDLY_METRICS", "0") != "0"
+STATS_FILE = os.environ.get("MINDLY_METRICS_FILE")
+STATS_INTERVAL = float(os.environ.get("MINDLY_METRICS_INTERVAL", "15"))
+PROFILE_DIR = os.environ.get("MINDLY_PROFILE_DIR")
+
+# Upper bounds (seconds) of the span histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_spans = {}     # name -> [bucket counts..., +Inf count, sum]
+_counters = {}  # (name, (label pairs)) -> value
+_help = {}      # counter name -> help text
+_NO_SPAN = nullcontext()
+
+
+# ======================
+# RECORDING
+# ======================
+def observe(name, seconds):
+    """Add one duration to the span histogram name"""
+    with _lock:
+        series = _spans.get(name)
+        if series is None:
+            series = _spans[name] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                series[i] += 1
+                break
+        else:
+            series[len(BUCKETS)] += 1
+        series[-1] += seconds
+    _ensure_writer()
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start)
+
+def span(name):
+    """Context manager timing its body into the span histogram name"""
+    return _Span(name) if ENABLED else _NO_SPAN
+
+def timed(name):
+    """Decorator: time every call as a span. Without MINDLY_METRICS the function is returned as is."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def count(name, value=1, help=None, **labels):
+    """Add value to the counter name{labels}"""
+    if not ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+        if help:
+            _help.setdefault(name, help)
+    _ensure_writer()
+
+
+# ======================
+# LLM ACCOUNTING
+# ======================
+def llm_succeeded(endpoint, messages, reply, usage=None):
+    """Count one completed LLM request and its tokens (the API's usage if given, else estimated)"""
+    if not ENABLED:
+        return
+    if usage and "prompt_tokens" in usage and "completion_tokens" in usage:
+        prompt, completion = usage["prompt_tokens"], usage["completion_tokens"]
+    else:
+        import context_window
+        prompt = sum(context_window.message_tokens(m) for m in messages)
+        completion = context_window.estimate_tokens(reply or "")
+    count("llm_requests", endpoint=endpoint, outcome="ok", help="LLM requests by endpoint and outcome")
+    count("llm_tokens", prompt, endpoint=endpoint, kind="prompt", help="LLM tokens sent and received")
+    count("llm_tokens", completion, endpoint=endpoint, kind="completion")
+
+def llm_failed(endpoint, error):
+    """Count one failed LLM request by error type (HTTP status where there is one)"""
+    if not ENABLED:
+        return
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    count("llm_requests", endpoint=endpoint, outcome="error")
+    count("llm_errors", endpoint=endpoint, error=f"http_{status}" if status else type(error).__name__,
+          help="Failed LLM requests by endpoint and error")
+
+
+# ======================
+# EXPORT
+# ======================
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    with _lock:
+        spans = {name: list(series) for name, series in _spans.items()}
+        counters = dict(_counters)
+        helps = dict(_help)
+
+    lines = []
+    if spans:
+        lines += ["# HELP mindly_span_seconds Time spent in instrumented operations",
+                  "# TYPE mindly_span_seconds histogram"]
+        for name in sorted(spans):
+            series = spans[name]
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), series):
+                cumulative += n
+                lines.append(f"mindly_span_seconds_bucket{_labels((('span', name), ('le', bound)))} {cumulative}")
+            lines.append(f"mindly_span_seconds_sum{_labels((('span', name),))} {series[-1]:.6f}")
+            lines.append(f"mindly_span_seconds_count{_labels((('span', name),))} {cumulative}")
+    for name in sorted({name for name, _ in counters}):
+        if name in helps:
+            lines.append(f"# HELP mindly_{name}_total {helps[name]}")
+        lines.append(f"# TYPE mindly_{name}_total counter")
+        for (metric, pairs), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"mindly_{name}_total{_labels(pairs)} {value}")
+    return "\n".join(lines) + "\n"
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+
+def write_stats_file(path=None):
+    """Write render() to the stats file (atomically, so scrapers never read half of it)"""
+    import safe_io
+    path = (path or STATS_FILE).replace("{pid}", str(os.getpid()))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    safe_io.atomic_write(path, render())
+
+# The writer thread starts with the first recorded value, so processes that
+# only import this module (e.g. password hashing workers) never write
+_writer = None
+
+def _ensure_writer():
+    global _writer
+    if _writer is not None or not STATS_FILE:
+        return
+    with _lock:
+        if _writer is not None:
+            return
+        _writer = threading.Thread(target=_write_periodically, name="mindly-metrics", daemon=True)
+    _writer.start()
+    atexit.register(write_stats_file)
+
+def _write_periodically():
+    while True:
+        time.sleep(STATS_INTERVAL)
+        try:
+            write_stats_file()
+        except OSError:
+            pass
+
+
+# ======================
+# PER-RERUN PROFILING
+# ======================
+# A Streamlit rerun calls begin_rerun() at the top of the script and
+# end_rerun() at the bottom. Reruns cut short by st.stop() or st.rerun()
+# never reach the bottom; their profile is dumped when the next rerun begins
+# (its file name still gives the time spent in the rerun itself).
+_open_profiles = {}  # thread -> (profiler, label)
+_profiles_lock = threading.Lock()
+
+def begin_rerun(label):
+    if not PROFILE_DIR:
+        return
+    import cProfile
+    current = threading.current_thread()
+    with _profiles_lock:
+        unfinished = [t for t in _open_profiles if t is current or not t.is_alive()]
+        leftovers = [_open_profiles.pop(t) for t in unfinished]
+    for entry in leftovers:
+        _dump(*entry)
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return  # Python 3.12+ allows one active profiler per process; another rerun has it
+    with _profiles_lock:
+        _open_profiles[current] = (profiler, label)
+
+def end_rerun():
+    if not PROFILE_DIR:
+        return
+    with _profiles_lock:
+        entry = _open_profiles.pop(threading.current_thread(), None)
+    if entry:
+        _dump(*entry)
+
+def _dump(profiler, label):
+    import pstats
+    profiler.disable()
+    elapsed_ms = pstats.Stats(profiler).total_tt * 1000
+    safe_label = "".join(c if c.isalnum() else "_" for c in label)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_label}-{elapsed_ms:.0f}ms.prof"
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect Mindly profile dumps")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show = sub.add_parser("profile", help="print the slowest functions of one or more .prof dumps")
+    show.add_argument("files", nargs="+")
+    show.add_argument("--top", type=int, default=25)
+    show.add_argument("--sort", default="cumulative", help="pstats sort key (cumulative, tottime, calls...)")
+    args = parser.parse_args()
+
+    import pstats
+    stats = pstats.Stats(*args.files)
+    stats.strip_dirs().sort_stats(args.sort).print_stats(args.top)
@@ -0,0 +1,77 @@
+# ======================
+# YAML/JSON -> SQLITE MIGRATION
+# ======================
+# Copies accounts from config/users.yaml and every user's saved chats
+# (legacy <user>_chats.json or the newer append-only logs) into the
+# SQLite backend. Safe to run more than once: existing rows are skipped.
+# Afterwards every user's conversation count and trait totals are compared
+# between the two backends, and any difference is reported.
+#
+#   python migrate_to_sqlite.py [--config config/users.yaml] [--db userdata/mindly.db]
+
+import argparse
+import os
+
+import chat_store
+from repository import FileRepository, SQLiteRepository
+
+
+def migrate(config_path, db_path):
+    source = FileRepository(config_path)
+    target = SQLiteRepository(db_path)
+    users = source.load_config()["credentials"]["usernames"] or {}
+
+    migrated_users = migrated_chats = 0
+    for username, info in users.items():
+        if not target.user_exists(username):
+            target.add_user(username, info.get("email", ""), info["password"], info.get("created_at"))
+            migrated_users += 1
+
+        for convo in source.load_conversations(username):
+            if target.has_conversation(username, convo["conversation_id"]):
+                continue
+            target.append_delta(
+                username,
+                convo["conversation_id"],
+                0,
+                convo["messages"],
+                convo.get("traits", {}),
+                convo.get("reactions"),
+                timestamp=convo.get("timestamp"),
+                display_name=convo.get("display_name"),
+                advice_points=convo.get("advice_points")
+            )
+            migrated_chats += 1
+
+    return migrated_users, migrated_chats
+
+
+def verify(config_path, db_path):
+    """Usernames whose chats or trait totals differ between the two backends"""
+    source = FileRepository(config_path)
+    target = SQLiteRepository(db_path)
+    mismatched = []
+    for username in source.load_config()["credentials"]["usernames"] or {}:
+        if (len(source.load_conversations(username)) != len(target.load_conversations(username))
+                or _nonzero(source.total_traits(username)) != _nonzero(target.total_traits(username))):
+            mismatched.append(username)
+    return mismatched
+
+def _nonzero(totals):
+    return {trait: value for trait, value in totals.items() if value}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import Mindly YAML/JSON data into SQLite")
+    parser.add_argument("--config", default=os.path.join("config", "users.yaml"))
+    parser.add_argument("--userdata", default=chat_store.USERDATA_DIR)
+    parser.add_argument("--db", default=os.path.join(chat_store.USERDATA_DIR, "mindly.db"))
+    args = parser.parse_args()
+
+    chat_store.USERDATA_DIR = args.userdata
+    users, chats = migrate(args.config, args.db)
+    print(f"Migrated {users} users and {chats} chats into {args.db}")
+    mismatched = verify(args.config, args.db)
+    if mismatched:
+        print(f"Chats or trait totals differ for: {', '.join(mismatched)}")
+        raise SystemExit(1)
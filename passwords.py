@@ -0,0 +1,165 @@
+# ======================
+# PASSWORD HASHING
+# ======================
+# PBKDF2 is deliberately expensive, so hashing runs in a small process pool
+# instead of on the Streamlit script thread: a burst of logins then uses at
+# most MINDLY_HASH_WORKERS cores and sessions that are already signed in keep
+# getting served. At most MINDLY_HASH_MAX_PENDING hashes may be queued;
+# beyond that callers get Busy instead of piling up, and a caller whose hash
+# takes longer than MINDLY_HASH_TIMEOUT seconds gets Busy too (the hash
+# keeps its slot until a worker finishes it). Workers are niced
+# (MINDLY_HASH_NICE) so chat work is scheduled ahead of them.
+#
+# MINDLY_HASH_ROUNDS is the work factor (PBKDF2 iterations). Stored hashes
+# made with a different value are re-hashed the next time their owner logs
+# in, so raising or lowering it needs no migration.
+#
+# Each username may attempt MINDLY_LOGIN_ATTEMPTS logins per
+# MINDLY_LOGIN_WINDOW seconds; a successful login clears its count.
+
+import collections
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import types
+from functools import lru_cache
+
+import metrics
+
+HASH_ROUNDS = int(os.environ.get("MINDLY_HASH_ROUNDS", "29000"))
+HASH_WORKERS = int(os.environ.get("MINDLY_HASH_WORKERS", str(min(2, os.cpu_count() or 1))))
+HASH_MAX_PENDING = int(os.environ.get("MINDLY_HASH_MAX_PENDING", "32"))
+HASH_WAIT = float(os.environ.get("MINDLY_HASH_WAIT", "5"))
+HASH_TIMEOUT = float(os.environ.get("MINDLY_HASH_TIMEOUT", "30"))
+# Workers run at a lower CPU priority so on a busy box chat sessions win
+HASH_NICE = int(os.environ.get("MINDLY_HASH_NICE", "10"))
+LOGIN_ATTEMPTS = int(os.environ.get("MINDLY_LOGIN_ATTEMPTS", "5"))
+LOGIN_WINDOW = float(os.environ.get("MINDLY_LOGIN_WINDOW", "60"))
+
+
+class Busy(Exception):
+    """Too many hashes queued; try again shortly"""
+
+
+# ======================
+# WORKER SIDE
+# ======================
+# These run in the pool's processes. passlib is imported there, not in the
+# app process.
+@lru_cache(maxsize=4)
+def _context(rounds):
+    from passlib.context import CryptContext
+    return CryptContext(
+        schemes=["pbkdf2_sha256"],
+        pbkdf2_sha256__default_rounds=rounds,
+        pbkdf2_sha256__min_desired_rounds=rounds,
+        pbkdf2_sha256__max_desired_rounds=rounds,
+    )
+
+def _init_worker(niceness):
+    if niceness and hasattr(os, "nice"):
+        os.nice(niceness)
+
+def _hash(password, rounds):
+    return _context(rounds).hash(password)
+
+def _verify(password, hashed_password, rounds):
+    """(matches, new_hash) where new_hash is set when the stored hash is out of date"""
+    return _context(rounds).verify_and_update(password, hashed_password)
+
+
+# ======================
+# POOL
+# ======================
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(HASH_MAX_PENDING)
+
+def _executor():
+    """The worker pool, started on first use.
+
+    Workers are spawned, not forked, because the Streamlit server is
+    multi-threaded. A spawned child normally re-runs the parent's __main__,
+    which under Streamlit is the app script, so the workers are started
+    with a bare __main__ in its place; they only need this module.
+    multiprocessing.Pool starts all of them up front, so that is the only
+    time __main__ is looked at.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            main = sys.modules["__main__"]
+            sys.modules["__main__"] = types.ModuleType("__main__")
+            try:
+                _pool = multiprocessing.get_context("spawn").Pool(
+                    HASH_WORKERS, initializer=_init_worker, initargs=(HASH_NICE,)
+                )
+            finally:
+                sys.modules["__main__"] = main
+        return _pool
+
+def _run(fn, *args):
+    if not _slots.acquire(timeout=HASH_WAIT):
+        raise Busy("Too many sign-ins in progress")
+    def release(_):
+        _slots.release()
+    try:
+        job = _executor().apply_async(fn, args, callback=release, error_callback=release)
+    except BaseException:
+        _slots.release()
+        raise
+    try:
+        return job.get(timeout=HASH_TIMEOUT)
+    except multiprocessing.TimeoutError:
+        raise Busy("Signing in took too long")
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.terminate()
+            _pool.join()
+            _pool = None
+
+@metrics.timed("password_hash")
+def hash_password(password):
+    """PBKDF2-HMAC-SHA256 hash with a random salt, computed in the pool"""
+    return _run(_hash, password, HASH_ROUNDS)
+
+@metrics.timed("password_verify")
+def verify_password(password, hashed_password):
+    """(matches, new_hash); new_hash is None unless the hash should be replaced"""
+    return _run(_verify, password, hashed_password, HASH_ROUNDS)
+
+
+# ======================
+# LOGIN RATE LIMIT
+# ======================
+_attempts = collections.defaultdict(collections.deque)
+_attempts_lock = threading.Lock()
+# Past this many tracked usernames, expired entries are swept on the next attempt
+_SWEEP_AT = 10000
+
+def _sweep(now):
+    for username in [u for u, recent in _attempts.items() if now - recent[-1] >= LOGIN_WINDOW]:
+        del _attempts[username]
+
+def retry_after(username):
+    """Seconds until username may try again; 0 if it may try now. Counts the attempt."""
+    now = time.monotonic()
+    with _attempts_lock:
+        if len(_attempts) >= _SWEEP_AT:
+            _sweep(now)
+        recent = _attempts[username]
+        while recent and now - recent[0] >= LOGIN_WINDOW:
+            recent.popleft()
+        if len(recent) >= LOGIN_ATTEMPTS:
+            return LOGIN_WINDOW - (now - recent[0])
+        recent.append(now)
+        return 0
+
+def login_succeeded(username):
+    with _attempts_lock:
+        _attempts.pop(username, None)
@@ -0,0 +1,513 @@
+# ======================
+# USER & CHAT REPOSITORY
+# ======================
+# The app talks to storage only through a repository object. Two backends:
+#   FileRepository   - config/users.yaml for accounts, chat_store logs for chats
+#   SQLiteRepository - one embedded database with indexed tables
+# Pick one with the MINDLY_STORAGE environment variable ("file" or "sqlite").
+# migrate_to_sqlite.py copies existing file data into the SQLite backend.
+
+import copy
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import yaml
+from yaml.loader import SafeLoader
+
+import chat_store
+import metrics
+import safe_io
+import search_index
+
+DEFAULT_CONFIG = {
+    "credentials": {
+        "usernames": {}
+    },
+    "cookie": {
+        "expiry_days": 30,
+        "key": "some_random_key_here",
+        "name": "theraipy_cookie"
+    },
+    "preauthorized": {
+        "emails": []
+    }
+}
+
+
+# ======================
+# FILE BACKEND
+# ======================
+# Streamlit reruns the script on every interaction, so the parsed users.yaml
+# is cached per process and only re-read when the file's stat signature
+# (mtime, size, inode) changes. Username checks use a frozenset built at
+# parse time.
+#
+# Changes to users.yaml re-read the file under its lock, apply the change
+# and atomically replace it (see safe_io), so concurrent registrations can't
+# drop each other's accounts and a crash mid-write can't leave a truncated
+# file behind.
+_config_cache = {}
+_config_lock = threading.Lock()
+
+class FileRepository:
+    """Accounts in a YAML file, chats in per-user append-only logs"""
+
+    def __init__(self, config_path):
+        self.config_path = config_path
+        if not os.path.exists(config_path):
+            os.makedirs(os.path.dirname(config_path) or ".", exist_ok=True)
+            with safe_io.locked(config_path):
+                if not os.path.exists(config_path):
+                    safe_io.atomic_write(config_path, yaml.dump(DEFAULT_CONFIG))
+
+    def _signature(self):
+        """Cheap change detector for the config file: one stat call"""
+        st = os.stat(self.config_path)
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _cached(self):
+        """Parse the YAML only when its stat signature changed since the last parse"""
+        signature = self._signature()
+        with _config_lock:
+            entry = _config_cache.get(self.config_path)
+            if entry is None or entry[0] != signature:
+                with open(self.config_path, "r") as file, metrics.span("config_load"):
+                    config = yaml.load(file, Loader=SafeLoader)
+                if config is None:
+                    raise Exception("Config file is empty")
+                usernames = frozenset(config["credentials"]["usernames"] or ())
+                entry = _config_cache[self.config_path] = (signature, config, usernames)
+        return entry
+
+    def invalidate(self):
+        with _config_lock:
+            _config_cache.pop(self.config_path, None)
+
+    def load_config(self):
+        """Parsed config, shared process-wide. Treat as read-only."""
+        return self._cached()[1]
+
+    def get_user(self, username):
+        if not self.user_exists(username):
+            return None
+        return self.load_config()["credentials"]["usernames"][username]
+
+    def user_exists(self, username):
+        return username in self._cached()[2]
+
+    def _update_config(self, change):
+        """Apply change(config) to the latest users.yaml and write it back atomically"""
+        with safe_io.locked(self.config_path):
+            config = copy.deepcopy(self.load_config())
+            change(config)
+            safe_io.atomic_write(self.config_path, yaml.dump(config))
+            self.invalidate()
+
+    def add_user(self, username, email, password_hash):
+        def add(config):
+            usernames = config["credentials"]["usernames"]
+            if usernames is None:
+                usernames = config["credentials"]["usernames"] = {}
+            if username in usernames:
+                raise safe_io.Conflict("Username already exists")
+            usernames[username] = {
+                "email": email,
+                "password": password_hash,
+                "name": username,
+                "created_at": datetime.now().isoformat()
+            }
+        self._update_config(add)
+
+    def update_password(self, username, password_hash):
+        def update(config):
+            config["credentials"]["usernames"][username]["password"] = password_hash
+        self._update_config(update)
+
+    def append_delta(self, username, conversation_id, base, messages, traits,
+                     reactions=None, previous_traits=None):
+        chat_store.append_delta(username, conversation_id, base, messages, traits,
+                                reactions, previous_traits)
+        search_index.index_delta(username, conversation_id, base, messages)
+
+    def load_conversations(self, username):
+        return chat_store.load_conversations(username)
+
+    def has_chats(self, username):
+        return chat_store.count_chats(username) > 0
+
+    def count_conversations(self, username):
+        return chat_store.count_conversations(username)
+
+    def list_conversations(self, username, offset=0, limit=20):
+        return chat_store.list_conversations(username, offset, limit)
+
+    def load_conversation(self, username, conversation_id):
+        return chat_store.load_conversation(username, conversation_id)
+
+    def conversation_traits(self, username, conversation_id):
+        return chat_store.conversation_traits(username, conversation_id)
+
+    def search_chats(self, username, query, limit=20):
+        """Ranked search hits merged with list_conversations()-style metadata"""
+        hits = {h["conversation_id"]: h for h in search_index.search(self, username, query, limit)}
+        return [{**entry, **hits[entry["conversation_id"]]}
+                for entry in chat_store.conversation_entries(username, hits)]
+
+    def rename_chat(self, username, conversation_id, display_name):
+        chat_store.rename_chat(username, conversation_id, display_name)
+        search_index.index_name(username, conversation_id, display_name)
+
+    def list_usernames(self):
+        return sorted(self.load_config()["credentials"]["usernames"] or {})
+
+    def apply_rescore(self, username, conversation_id, message_count, traits, advice_points):
+        chat_store.append_rescore(username, conversation_id, message_count, traits, advice_points)
+        search_index.index_advice(username, conversation_id, advice_points)
+
+    def total_traits(self, username):
+        return chat_store.trait_totals(username)
+
+    def rebuild_trait_totals(self, username):
+        return chat_store.rebuild_trait_totals(username)
+
+
+# ======================
+# SQLITE BACKEND
+# ======================
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username   TEXT PRIMARY KEY,
+    email      TEXT,
+    name       TEXT,
+    password   TEXT NOT NULL,
+    created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS chats (
+    username        TEXT NOT NULL REFERENCES users(username),
+    conversation_id TEXT NOT NULL,
+    display_name    TEXT,
+    created_at      TEXT,
+    updated_at      TEXT,
+    reactions       TEXT,
+    advice_points   TEXT,
+    PRIMARY KEY (username, conversation_id)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    username        TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    position        INTEGER NOT NULL,
+    role            TEXT NOT NULL,
+    content         TEXT NOT NULL,
+    PRIMARY KEY (username, conversation_id, position),
+    FOREIGN KEY (username, conversation_id) REFERENCES chats(username, conversation_id)
+);
+CREATE TABLE IF NOT EXISTS traits (
+    username        TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    trait           TEXT NOT NULL,
+    value           INTEGER NOT NULL,
+    PRIMARY KEY (username, conversation_id, trait),
+    FOREIGN KEY (username, conversation_id) REFERENCES chats(username, conversation_id)
+);
+CREATE TABLE IF NOT EXISTS trait_totals (
+    username TEXT NOT NULL REFERENCES users(username),
+    trait    TEXT NOT NULL,
+    value    INTEGER NOT NULL,
+    PRIMARY KEY (username, trait)
+);
+CREATE INDEX IF NOT EXISTS idx_chats_user_created ON chats(username, created_at);
+"""
+
+
+class SQLiteRepository:
+    """Everything in one embedded SQLite database"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self):
+        """One connection per thread; Streamlit runs each session on its own thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def get_user(self, username):
+        row = self._conn().execute(
+            "SELECT email, name, password, created_at FROM users WHERE username = ?",
+            (username,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def user_exists(self, username):
+        return self._conn().execute(
+            "SELECT 1 FROM users WHERE username = ?", (username,)
+        ).fetchone() is not None
+
+    def add_user(self, username, email, password_hash, created_at=None):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO users (username, email, name, password, created_at) VALUES (?, ?, ?, ?, ?)",
+                (username, email, username, password_hash, created_at or datetime.now().isoformat())
+            )
+
+    def update_password(self, username, password_hash):
+        with self._conn() as conn:
+            conn.execute("UPDATE users SET password = ? WHERE username = ?", (password_hash, username))
+
+    def append_delta(self, username, conversation_id, base, messages, traits,
+                     reactions=None, previous_traits=None, timestamp=None, display_name=None,
+                     advice_points=None):
+        # previous_traits is accepted for interface parity; the stored per-chat
+        # rows are authoritative here
+        timestamp = timestamp or datetime.now().isoformat()
+        with self._conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._check_message_count(conn, username, conversation_id, base)
+            previous = dict(conn.execute(
+                "SELECT trait, value FROM traits WHERE username = ? AND conversation_id = ?",
+                (username, conversation_id)
+            ).fetchall())
+            conn.executemany(
+                """INSERT INTO trait_totals (username, trait, value) VALUES (?, ?, ?)
+                   ON CONFLICT(username, trait) DO UPDATE SET value = value + excluded.value""",
+                [(username, trait, traits.get(trait, 0) - previous.get(trait, 0))
+                 for trait in set(traits) | set(previous)]
+            )
+            conn.execute(
+                """INSERT INTO chats (username, conversation_id, display_name, created_at, updated_at,
+                                      reactions, advice_points)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(username, conversation_id) DO UPDATE SET
+                       updated_at = excluded.updated_at,
+                       reactions = COALESCE(excluded.reactions, chats.reactions),
+                       display_name = COALESCE(excluded.display_name, chats.display_name),
+                       advice_points = COALESCE(excluded.advice_points, chats.advice_points)""",
+                (username, conversation_id, display_name, timestamp, timestamp,
+                 json.dumps(reactions) if reactions else None,
+                 json.dumps(advice_points) if advice_points else None)
+            )
+            conn.execute(
+                "DELETE FROM messages WHERE username = ? AND conversation_id = ? AND position >= ?",
+                (username, conversation_id, base)
+            )
+            conn.executemany(
+                "INSERT INTO messages (username, conversation_id, position, role, content) VALUES (?, ?, ?, ?, ?)",
+                [(username, conversation_id, base + i, m["role"], m["content"]) for i, m in enumerate(messages)]
+            )
+            conn.executemany(
+                """INSERT INTO traits (username, conversation_id, trait, value) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(username, conversation_id, trait) DO UPDATE SET value = excluded.value""",
+                [(username, conversation_id, trait, value) for trait, value in traits.items()]
+            )
+        search_index.index_delta(username, conversation_id, base, messages)
+        if display_name:
+            search_index.index_name(username, conversation_id, display_name)
+
+    def _check_message_count(self, conn, username, conversation_id, expected):
+        """Optimistic version check: a write must start from the saved message count"""
+        saved = conn.execute(
+            "SELECT COUNT(*) FROM messages WHERE username = ? AND conversation_id = ?",
+            (username, conversation_id)
+        ).fetchone()[0]
+        if saved != expected:
+            raise safe_io.Conflict(
+                f"conversation {conversation_id} has {saved} saved messages, not {expected}"
+            )
+
+    def _conversation(self, conn, chat):
+        """Full transcript dict for one chats row"""
+        key = (chat["username"], chat["conversation_id"])
+        convo = {
+            "conversation_id": chat["conversation_id"],
+            "timestamp": chat["created_at"],
+            "updated_at": chat["updated_at"],
+            "messages": [
+                {"role": m["role"], "content": m["content"]}
+                for m in conn.execute(
+                    "SELECT role, content FROM messages WHERE username = ? AND conversation_id = ? ORDER BY position",
+                    key
+                )
+            ],
+            "traits": {
+                t["trait"]: t["value"]
+                for t in conn.execute(
+                    "SELECT trait, value FROM traits WHERE username = ? AND conversation_id = ?",
+                    key
+                )
+            },
+        }
+        if chat["display_name"]:
+            convo["display_name"] = chat["display_name"]
+        if chat["reactions"]:
+            convo["reactions"] = json.loads(chat["reactions"])
+        if chat["advice_points"]:
+            convo["advice_points"] = json.loads(chat["advice_points"])
+        return convo
+
+    def load_conversations(self, username):
+        conn = self._conn()
+        return [
+            self._conversation(conn, chat)
+            for chat in conn.execute(
+                "SELECT * FROM chats WHERE username = ? ORDER BY created_at, rowid", (username,)
+            ).fetchall()
+        ]
+
+    def count_conversations(self, username):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM chats WHERE username = ?", (username,)
+        ).fetchone()[0]
+
+    def list_conversations(self, username, offset=0, limit=20):
+        """One page of conversation metadata, newest first (see chat_store.list_conversations)"""
+        total = self.count_conversations(username)
+        rows = self._conn().execute(
+            """SELECT c.conversation_id, c.display_name, c.created_at, c.updated_at,
+                      (SELECT COUNT(*) FROM messages m
+                       WHERE m.username = c.username AND m.conversation_id = c.conversation_id) AS message_count
+               FROM chats c WHERE c.username = ?
+               ORDER BY c.created_at DESC, c.rowid DESC LIMIT ? OFFSET ?""",
+            (username, limit, offset)
+        ).fetchall()
+        return [
+            {
+                "conversation_id": row["conversation_id"],
+                "display_name": row["display_name"],
+                "timestamp": row["created_at"],
+                "updated_at": row["updated_at"],
+                "message_count": row["message_count"],
+                "number": total - offset - i,
+            }
+            for i, row in enumerate(rows)
+        ]
+
+    def load_conversation(self, username, conversation_id):
+        conn = self._conn()
+        chat = conn.execute(
+            "SELECT * FROM chats WHERE conversation_id = ? AND username = ?", (conversation_id, username)
+        ).fetchone()
+        return self._conversation(conn, chat) if chat else None
+
+    def conversation_traits(self, username, conversation_id):
+        """The traits a conversation was last saved with, or None if it was never saved"""
+        if not self.has_conversation(username, conversation_id):
+            return None
+        rows = self._conn().execute(
+            "SELECT trait, value FROM traits WHERE username = ? AND conversation_id = ?",
+            (username, conversation_id)
+        )
+        return {row["trait"]: row["value"] for row in rows}
+
+    def search_chats(self, username, query, limit=20):
+        """Ranked search hits merged with list_conversations()-style metadata"""
+        hits = search_index.search(self, username, query, limit)
+        if not hits:
+            return []
+        rows = self._conn().execute(
+            f"""SELECT c.conversation_id, c.display_name, c.created_at, c.updated_at,
+                       (SELECT COUNT(*) FROM messages m
+                       WHERE m.username = c.username AND m.conversation_id = c.conversation_id) AS message_count,
+                       (SELECT COUNT(*) FROM chats o WHERE o.username = c.username
+                            AND (o.created_at, o.rowid) <= (c.created_at, c.rowid)) AS number
+                FROM chats c
+                WHERE c.username = ? AND c.conversation_id IN ({",".join("?" * len(hits))})""",
+            (username, *(h["conversation_id"] for h in hits))
+        ).fetchall()
+        entries = {
+            row["conversation_id"]: {
+                "conversation_id": row["conversation_id"],
+                "display_name": row["display_name"],
+                "timestamp": row["created_at"],
+                "updated_at": row["updated_at"],
+                "message_count": row["message_count"],
+                "number": row["number"],
+            }
+            for row in rows
+        }
+        return [{**entries[h["conversation_id"]], **h} for h in hits if h["conversation_id"] in entries]
+
+    def has_chats(self, username):
+        return self._conn().execute(
+            "SELECT 1 FROM chats WHERE username = ? LIMIT 1", (username,)
+        ).fetchone() is not None
+
+    def has_conversation(self, username, conversation_id):
+        return self._conn().execute(
+            "SELECT 1 FROM chats WHERE username = ? AND conversation_id = ?", (username, conversation_id)
+        ).fetchone() is not None
+
+    def rename_chat(self, username, conversation_id, display_name):
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE chats SET display_name = ? WHERE conversation_id = ? AND username = ?",
+                (display_name, conversation_id, username)
+            )
+        search_index.index_name(username, conversation_id, display_name)
+
+    def list_usernames(self):
+        return [row["username"] for row in self._conn().execute("SELECT username FROM users ORDER BY username")]
+
+    def apply_rescore(self, username, conversation_id, message_count, traits, advice_points):
+        with self._conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._check_message_count(conn, username, conversation_id, message_count)
+            conn.execute("DELETE FROM traits WHERE username = ? AND conversation_id = ?", (username, conversation_id))
+            conn.executemany(
+                "INSERT INTO traits (username, conversation_id, trait, value) VALUES (?, ?, ?, ?)",
+                [(username, conversation_id, trait, value) for trait, value in traits.items()]
+            )
+            conn.execute(
+                "UPDATE chats SET advice_points = ? WHERE username = ? AND conversation_id = ?",
+                (json.dumps(advice_points) if advice_points else None, username, conversation_id)
+            )
+        search_index.index_advice(username, conversation_id, advice_points)
+
+    def total_traits(self, username):
+        rows = self._conn().execute(
+            "SELECT trait, value FROM trait_totals WHERE username = ?", (username,)
+        )
+        return {row["trait"]: row["value"] for row in rows}
+
+    def rebuild_trait_totals(self, username):
+        """Recompute a user's totals from the per-chat trait rows"""
+        with self._conn() as conn:
+            conn.execute("DELETE FROM trait_totals WHERE username = ?", (username,))
+            conn.execute(
+                """INSERT INTO trait_totals (username, trait, value)
+                   SELECT username, trait, SUM(value) FROM traits WHERE username = ?
+                   GROUP BY username, trait""",
+                (username,)
+            )
+        return self.total_traits(username)
+
+
+_repositories = {}
+
+def get_repository(config_path):
+    """Return the process-wide backend selected by MINDLY_STORAGE"""
+    backend = os.environ.get("MINDLY_STORAGE", "file").lower()
+    if backend == "sqlite":
+        db_path = os.environ.get("MINDLY_DB_PATH", os.path.join(chat_store.USERDATA_DIR, "mindly.db"))
+        key = (backend, db_path)
+        if key not in _repositories:
+            _repositories[key] = SQLiteRepository(db_path)
+    elif backend == "file":
+        key = (backend, config_path)
+        if key not in _repositories:
+            _repositories[key] = FileRepository(config_path)
+        _repositories[key].load_config()
+    else:
+        raise ValueError(f"Unknown MINDLY_STORAGE backend: {backend}")
+    return _repositories[key]
@@ -0,0 +1,146 @@
+# ======================
+# BULK RE-SCORING PIPELINE
+# ======================
+# Re-runs trait and advice extraction over every user's saved conversations,
+# e.g. after the lexicons in trait_matcher change, and writes the results
+# back through the configured storage backend (MINDLY_STORAGE).
+#
+# Users are processed in parallel on a process pool. Finished users are
+# appended to a checkpoint file, so an interrupted run picks up where it
+# stopped; the checkpoint is tied to a fingerprint of the lexicons and
+# starts over automatically when they change.
+#
+#   python rescore.py [--workers 8] [--checkpoint userdata/rescore.checkpoint] [--restart] [--dry-run]
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import chat_store
+import repository
+import safe_io
+from trait_matcher import ADVICE_PHRASES, TRAIT_PATTERNS, default_matcher
+
+CONFIG_PATH = os.path.join("config", "users.yaml")
+DEFAULT_CHECKPOINT = os.path.join(chat_store.USERDATA_DIR, "rescore.checkpoint")
+
+
+def lexicon_fingerprint():
+    material = json.dumps([TRAIT_PATTERNS, ADVICE_PHRASES], sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+
+def score_conversation(convo):
+    """Recompute (traits, advice_points) for one conversation from its replies"""
+    traits = {trait: 0 for trait in TRAIT_PATTERNS}
+    advice_points = []
+    kept = {a.get("uid"): a for a in convo.get("advice_points", []) if isinstance(a, dict)}
+    for i, msg in enumerate(convo["messages"]):
+        # messages[0] is the canned greeting, which was never scored
+        if msg.get("role") != "assistant" or i == 0:
+            continue
+        hits, sentences = default_matcher.scan(msg["content"])
+        for trait, count in hits.items():
+            traits[trait] += count
+        for sentence in sentences:
+            uid = hashlib.sha1(f"{convo['conversation_id']}:{i}:{sentence}".encode("utf-8")).hexdigest()[:6]
+            advice_points.append(kept.get(uid) or {
+                "text": sentence,
+                "timestamp": convo.get("updated_at") or convo.get("timestamp"),
+                "refined": False,
+                "uid": uid
+            })
+    return traits, advice_points
+
+
+def rescore_user(config_path, username, dry_run=False):
+    """Worker entry point. Returns (username, conversations, changed)."""
+    repo = repository.get_repository(config_path)
+    conversations = repo.load_conversations(username)
+    changed = 0
+    for convo in conversations:
+        traits, advice_points = score_conversation(convo)
+        old_advice = [a.get("uid") if isinstance(a, dict) else a for a in convo.get("advice_points", [])]
+        if traits == convo.get("traits") and [a["uid"] for a in advice_points] == old_advice:
+            continue
+        if not dry_run:
+            try:
+                repo.apply_rescore(username, convo["conversation_id"], len(convo["messages"]), traits, advice_points)
+            except safe_io.Conflict:
+                # A session saved to it while we were scoring; its save carries current traits
+                continue
+        changed += 1
+    if changed and not dry_run:
+        repo.rebuild_trait_totals(username)
+    return username, len(conversations), changed
+
+
+def load_checkpoint(path, fingerprint, restart):
+    """Usernames already finished under the current lexicons"""
+    if restart or not os.path.exists(path):
+        return set()
+    with open(path, "r") as f:
+        header = f.readline().strip()
+        if header != fingerprint:
+            return set()
+        return {line.strip() for line in f if line.strip()}
+
+def open_checkpoint(path, fingerprint, done):
+    if done:
+        return open(path, "a")
+    f = open(path, "w")
+    f.write(fingerprint + "\n")
+    f.flush()
+    return f
+
+
+def run(config_path, workers, checkpoint_path, restart=False, dry_run=False):
+    fingerprint = lexicon_fingerprint()
+    usernames = repository.get_repository(config_path).list_usernames()
+    done = load_checkpoint(checkpoint_path, fingerprint, restart)
+    pending = [u for u in usernames if u not in done]
+    print(f"{len(usernames)} users, {len(done)} already done, {len(pending)} to rescore "
+          f"with {workers} workers (lexicon {fingerprint})")
+
+    start = time.perf_counter()
+    users_done = conversations = changed = 0
+    checkpoint = None if dry_run else open_checkpoint(checkpoint_path, fingerprint, done)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(rescore_user, config_path, u, dry_run) for u in pending]
+            for future in as_completed(futures):
+                username, convo_count, changed_count = future.result()
+                users_done += 1
+                conversations += convo_count
+                changed += changed_count
+                if checkpoint:
+                    checkpoint.write(username + "\n")
+                    checkpoint.flush()
+                if users_done % 100 == 0 or users_done == len(pending):
+                    elapsed = time.perf_counter() - start
+                    print(f"  {users_done}/{len(pending)} users | {conversations} conversations | "
+                          f"{users_done / elapsed:.1f} users/s | {conversations / elapsed:.1f} conv/s",
+                          flush=True)
+    finally:
+        if checkpoint:
+            checkpoint.close()
+
+    elapsed = time.perf_counter() - start
+    verb = "would change" if dry_run else "updated"
+    print(f"Done in {elapsed:.1f}s: {verb} {changed} of {conversations} conversations")
+    return changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score traits and advice for all saved chats")
+    parser.add_argument("--config", default=CONFIG_PATH)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="report changes without writing")
+    args = parser.parse_args()
+
+    run(args.config, args.workers, args.checkpoint, args.restart, args.dry_run)
@@ -0,0 +1,106 @@
+# ======================
+# SAFE FILE I/O
+# ======================
+# Building blocks for the file storage backend so that a crash or two
+# sessions writing at once can't truncate or interleave data:
+#
+#   atomic_write(path, data)  write a temp file in the same directory, fsync
+#                             it and os.replace() it over path; readers see
+#                             the old file or the new one, never half of one
+#   locked(path)              exclusive fcntl advisory lock on path + ".lock"
+#                             for a read-modify-write; re-entrant per thread
+#   Conflict                  raised when a write was based on a stale
+#                             version of the data (optimistic versioning)
+#
+# Locks are advisory and only coordinate processes that use them, which is
+# every Mindly process touching the data directory. Where fcntl is missing
+# (Windows), locked() still serializes the threads of one process.
+
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class Conflict(Exception):
+    """The data changed since the writer last read it"""
+
+
+def atomic_write(path, data):
+    """Replace path with data (bytes or str) in one step"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    directory = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    _fsync_dir(directory)
+
+def _fsync_dir(directory):
+    """Make the rename itself durable (not supported everywhere)"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+# path -> threading.RLock, so threads of one process queue up before the
+# fcntl lock (which is per open file, not per thread)
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+_held = threading.local()
+
+def _thread_lock(path):
+    with _thread_locks_guard:
+        lock = _thread_locks.get(path)
+        if lock is None:
+            lock = _thread_locks[path] = threading.RLock()
+        return lock
+
+@contextmanager
+def locked(path):
+    """Hold the exclusive lock for path. Nested use on one thread is a no-op."""
+    path = os.path.abspath(path)
+    held = getattr(_held, "paths", None)
+    if held is None:
+        held = _held.paths = {}
+    if held.get(path):
+        held[path] += 1
+        try:
+            yield
+        finally:
+            held[path] -= 1
+        return
+    with _thread_lock(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            held[path] = 1
+            try:
+                yield
+            finally:
+                held.pop(path, None)
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,220 @@
+# ======================
+# SAVED CHAT SEARCH INDEX
+# ======================
+# Full-text search over a user's saved conversations (message content,
+# advice points and chat names) using SQLite FTS5. The index lives in its own
+# file next to the chat data and is shared by both storage backends: the
+# repositories feed it every saved delta, so it is updated incrementally on
+# autosave and manual save. A user's index is (re)built from their saved
+# chats the first time they search, if an update ever failed, or with
+#
+#   python search_index.py [--config config/users.yaml] [--user NAME]
+
+import argparse
+import os
+import re
+import sqlite3
+import threading
+
+INDEX_PATH = os.environ.get("MINDLY_SEARCH_PATH", os.path.join("userdata", "search.db"))
+
+# docs is the source of truth; chat_fts indexes its text column as an
+# external-content table kept in sync by triggers. The owner column holds
+# one opaque token per user so a query can be scoped to one user inside the
+# FTS match itself.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id              INTEGER PRIMARY KEY,
+    owner           TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    kind            TEXT NOT NULL,
+    position        TEXT NOT NULL,
+    text            TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_docs_key ON docs(owner, conversation_id, kind, position);
+CREATE VIRTUAL TABLE IF NOT EXISTS chat_fts USING fts5(
+    owner, text, content='docs', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS docs_ai AFTER INSERT ON docs BEGIN
+    INSERT INTO chat_fts(rowid, owner, text) VALUES (new.id, new.owner, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS docs_ad AFTER DELETE ON docs BEGIN
+    INSERT INTO chat_fts(chat_fts, rowid, owner, text) VALUES ('delete', old.id, old.owner, old.text);
+END;
+CREATE TABLE IF NOT EXISTS indexed_users (
+    owner TEXT PRIMARY KEY
+);
+"""
+
+WORD = re.compile(r"\w+", re.UNICODE)
+
+_local = threading.local()
+
+
+def _conn():
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != INDEX_PATH:
+        os.makedirs(os.path.dirname(INDEX_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(INDEX_PATH, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        _local.conn, _local.path = conn, INDEX_PATH
+    return conn
+
+
+def _owner(username):
+    """Single FTS token for a username, whatever characters it contains"""
+    return "u" + username.encode("utf-8").hex()
+
+def _message_rows(owner, conversation_id, base, messages):
+    return [(owner, conversation_id, "message", str(base + i), m.get("content", ""))
+            for i, m in enumerate(messages) if m.get("content")]
+
+def _advice_rows(owner, conversation_id, advice_points):
+    rows = []
+    for i, advice in enumerate(advice_points or []):
+        text = advice.get("text") if isinstance(advice, dict) else advice
+        uid = advice.get("uid") if isinstance(advice, dict) else None
+        if text:
+            rows.append((owner, conversation_id, "advice", uid or str(i), text))
+    return rows
+
+def _insert(conn, rows):
+    conn.executemany(
+        "INSERT OR REPLACE INTO docs (owner, conversation_id, kind, position, text) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+
+def _mark_stale(username):
+    """Forget that a user is indexed so their next search rebuilds it"""
+    try:
+        with _conn() as conn:
+            conn.execute("DELETE FROM indexed_users WHERE owner = ?", (_owner(username),))
+    except sqlite3.Error:
+        pass
+
+
+# ======================
+# INCREMENTAL UPDATES
+# ======================
+# Called by the repositories after the chat data itself is written. A
+# failure here must never fail the save, so errors only mark the user's
+# index as stale.
+def index_delta(username, conversation_id, base, messages):
+    """Replace a conversation's messages from position base onwards"""
+    owner = _owner(username)
+    try:
+        with _conn() as conn:
+            conn.execute(
+                """DELETE FROM docs WHERE owner = ? AND conversation_id = ? AND kind = 'message'
+                   AND CAST(position AS INTEGER) >= ?""",
+                (owner, conversation_id, base)
+            )
+            _insert(conn, _message_rows(owner, conversation_id, base, messages))
+    except sqlite3.Error:
+        _mark_stale(username)
+
+def index_advice(username, conversation_id, advice_points):
+    """Replace a conversation's advice points"""
+    owner = _owner(username)
+    try:
+        with _conn() as conn:
+            conn.execute(
+                "DELETE FROM docs WHERE owner = ? AND conversation_id = ? AND kind = 'advice'",
+                (owner, conversation_id)
+            )
+            _insert(conn, _advice_rows(owner, conversation_id, advice_points))
+    except sqlite3.Error:
+        _mark_stale(username)
+
+def index_name(username, conversation_id, display_name):
+    owner = _owner(username)
+    try:
+        with _conn() as conn:
+            conn.execute(
+                "DELETE FROM docs WHERE owner = ? AND conversation_id = ? AND kind = 'name'",
+                (owner, conversation_id)
+            )
+            if display_name:
+                _insert(conn, [(owner, conversation_id, "name", "0", display_name)])
+    except sqlite3.Error:
+        _mark_stale(username)
+
+
+# ======================
+# REBUILD & SEARCH
+# ======================
+def rebuild(repo, username):
+    """Re-index all of a user's saved conversations. Returns the number indexed."""
+    owner = _owner(username)
+    conversations = repo.load_conversations(username)
+    with _conn() as conn:
+        conn.execute("DELETE FROM docs WHERE owner = ?", (owner,))
+        for convo in conversations:
+            conversation_id = convo["conversation_id"]
+            _insert(conn, _message_rows(owner, conversation_id, 0, convo.get("messages", [])))
+            _insert(conn, _advice_rows(owner, conversation_id, convo.get("advice_points")))
+            if convo.get("display_name"):
+                _insert(conn, [(owner, conversation_id, "name", "0", convo["display_name"])])
+        conn.execute("INSERT OR IGNORE INTO indexed_users (owner) VALUES (?)", (owner,))
+    return len(conversations)
+
+def is_indexed(username):
+    return _conn().execute(
+        "SELECT 1 FROM indexed_users WHERE owner = ?", (_owner(username),)
+    ).fetchone() is not None
+
+def match_expression(query):
+    """FTS5 query for free text: every word must appear, the last one as a prefix"""
+    words = WORD.findall(query)
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words[:-1]] + [f'"{words[-1]}"*']
+    return " AND ".join(terms)
+
+def search(repo, username, query, limit=20, snippet_tokens=12):
+    """Conversations matching query, best first.
+
+    Each result has conversation_id, snippet (matches wrapped in **), hits
+    (matching messages/advice/names) and score (lower is better, BM25).
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return []
+    if not is_indexed(username):
+        rebuild(repo, username)
+    rows = _conn().execute(
+        """SELECT d.conversation_id,
+                   snippet(chat_fts, 1, '**', '**', '…', ?) AS snippet,
+                   bm25(chat_fts) AS score
+            FROM chat_fts JOIN docs d ON d.id = chat_fts.rowid
+            WHERE chat_fts MATCH ?
+            ORDER BY score
+            LIMIT ?""",
+        (snippet_tokens, f'owner:"{_owner(username)}" AND ({expression})', limit * 10)
+    ).fetchall()
+    results = {}
+    for conversation_id, snippet, score in rows:
+        result = results.get(conversation_id)
+        if result is None:
+            if len(results) == limit:
+                continue
+            result = results[conversation_id] = {
+                "conversation_id": conversation_id, "snippet": snippet, "score": score, "hits": 0
+            }
+        result["hits"] += 1
+    return list(results.values())
+
+
+if __name__ == "__main__":
+    import repository
+
+    parser = argparse.ArgumentParser(description="Rebuild the saved-chat search index")
+    parser.add_argument("--config", default=os.path.join("config", "users.yaml"))
+    parser.add_argument("--user", help="only this user (default: everyone)")
+    args = parser.parse_args()
+
+    repo = repository.get_repository(args.config)
+    for username in [args.user] if args.user else repo.list_usernames():
+        print(f"{username}: indexed {rebuild(repo, username)} conversations")
@@ -0,0 +1,74 @@
+# ======================
+# TRAIT CHARTS
+# ======================
+# Renders the horizontal trait bar charts shown on the Profile and Saved
+# pages. Streamlit reruns the page on every interaction, so rendered images
+# are memoized by their inputs (the trait vector plus labels and size) and
+# an unchanged profile costs a dictionary lookup instead of a matplotlib
+# render. Figures are built with the object-oriented matplotlib API rather
+# than pyplot, so nothing is registered globally and each figure is cleared
+# as soon as it has been saved.
+#
+# MINDLY_CHART_BACKEND picks the output:
+#   png     cached PNG bytes (default)
+#   svg     cached SVG text, sharper and smaller for six bars
+#   native  Streamlit's own bar chart (Vega-Lite), no matplotlib at all
+
+import io
+import os
+from functools import lru_cache
+
+import metrics
+
+BACKEND = os.environ.get("MINDLY_CHART_BACKEND", "png")
+CACHE_SIZE = int(os.environ.get("MINDLY_CHART_CACHE_SIZE", "256"))
+BAR_COLOR = "#6eb5ff"
+SIZES = {
+    "profile": (10, 6),
+    "snapshot": (8, 4),
+}
+
+
+def chart_key(traits, skip_zero=False):
+    """Hashable, order-preserving form of a trait dict, used as the cache key"""
+    return tuple((t, v) for t, v in traits.items() if v > 0 or not skip_zero)
+
+
+@metrics.timed("chart_render")
+def _render(items, fmt, size, title, xlabel):
+    # Imported here so pages without charts (and the native backend) never load matplotlib
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=SIZES[size])
+    try:
+        ax = fig.subplots()
+        ax.barh([t for t, _ in items], [v for _, v in items], color=BAR_COLOR)
+        if xlabel:
+            ax.set_xlabel(xlabel)
+        if title:
+            ax.set_title(title)
+        ax.invert_yaxis()
+        buf = io.BytesIO()
+        fig.savefig(buf, format=fmt, bbox_inches="tight")
+        return buf.getvalue()
+    finally:
+        fig.clear()
+
+@lru_cache(maxsize=CACHE_SIZE)
+def render_png(items, size="profile", title=None, xlabel=None):
+    """PNG bytes for a chart_key(); memoized"""
+    return _render(items, "png", size, title, xlabel)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def render_svg(items, size="profile", title=None, xlabel=None):
+    """SVG markup for a chart_key(); memoized"""
+    return _render(items, "svg", size, title, xlabel).decode("utf-8")
+
+
+def native_data(items):
+    """Column data for st.bar_chart(x="Trait", y="Score")"""
+    return {"Trait": [t for t, _ in items], "Score": [v for _, v in items]}
+
+
+def cache_info():
+    return {"png": render_png.cache_info(), "svg": render_svg.cache_info()}
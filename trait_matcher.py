@@ -0,0 +1,130 @@
+# ======================
+# COMPILED TRAIT & ADVICE MATCHER
+# ======================
+# All trait keywords and advice phrases compiled into one regular expression
+# and scanned in a single pass over the reply. Semantics match the original
+# per-keyword loops:
+#   - traits: each keyword counts at most once per text, matched
+#     case-insensitively on word boundaries (re.search(rf"\b{kw}\b", ...))
+#   - advice: a sentence is advice if any phrase occurs anywhere in it,
+#     case-insensitively, with no word-boundary requirement
+# Sentences are split exactly like extract_advice() did.
+
+import re
+
+TRAIT_PATTERNS = {
+    "Empathy": ["understand", "empathize", "feel for", "that sounds hard"],
+    "Self-Awareness": ["aware", "reflect", "realize"],
+    "Anxiety": ["anxious", "worried", "nervous"],
+    "Optimism": ["hope", "bright side", "improve"],
+    "Mood Swings": ["mixed feelings", "change a lot"],
+    "Confidence": ["you can", "strong", "believe in yourself"]
+}
+
+ADVICE_PHRASES = [
+    "try", "suggest", "recommend", "consider",
+    "might help", "could benefit", "you might",
+    "advise", "helpful to", "would recommend"
+]
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?]) +')
+
+
+def _alternation(words):
+    # Longest first so a shorter keyword never shadows a longer one at the same position
+    return "|".join(re.escape(w) for w in sorted(set(words), key=len, reverse=True))
+
+
+class Matcher:
+    """Precompiled scanner for a set of trait lexicons and advice phrases"""
+
+    def __init__(self, trait_patterns=TRAIT_PATTERNS, advice_phrases=ADVICE_PHRASES):
+        self.trait_patterns = trait_patterns
+        self.advice_phrases = advice_phrases
+        self.keyword_traits = {}
+        for trait, keywords in trait_patterns.items():
+            for kw in keywords:
+                self.keyword_traits.setdefault(kw.lower(), []).append(trait)
+        # scan() restarts the search one character after each hit rather than
+        # after its end, so keywords that overlap each other are all reported.
+        # At a given position the longest keyword wins; shorter keywords that
+        # are prefixes of it ("feel" in "feel for") are checked with anchored
+        # matches, and so is an advice phrase starting at the same position.
+        # Patterns run case-sensitively over text.lower(), which is much faster
+        # than re.IGNORECASE; the leading character-class lookahead lets the
+        # engine skip positions that cannot start any keyword.
+        words = list(self.keyword_traits) + [p.lower() for p in advice_phrases]
+        first_chars = re.escape("".join(sorted({w[0] for w in words})))
+        body = rf"(?P<trait>\b(?:{_alternation(self.keyword_traits)})\b)|(?P<advice>{_alternation(p.lower() for p in advice_phrases)})"
+        self.scanner = re.compile(rf"(?=[{first_chars}])(?:{body})")
+        self.advice_at = re.compile(_alternation(p.lower() for p in advice_phrases))
+        # For the rare text whose length changes when lowercased
+        self.scanner_ci = re.compile(body, re.IGNORECASE)
+        self.advice_at_ci = re.compile(_alternation(advice_phrases), re.IGNORECASE)
+        # keyword -> [(shorter keyword, pattern, case-insensitive pattern)] for its keyword prefixes
+        self.prefix_keywords = {}
+        for kw in self.keyword_traits:
+            for other in self.keyword_traits:
+                if len(other) < len(kw) and kw.startswith(other):
+                    self.prefix_keywords.setdefault(kw, []).append(
+                        (other, re.compile(rf"{re.escape(other)}\b"), re.compile(rf"{re.escape(other)}\b", re.IGNORECASE))
+                    )
+
+    def scan(self, text):
+        """One pass over text. Returns (trait_hits, advice_sentences).
+
+        trait_hits maps trait -> number of distinct keywords found;
+        advice_sentences lists sentences containing an advice phrase.
+        """
+        sentences = [s.strip() for s in SENTENCE_SPLIT.split(text)]
+        # End offset of each sentence in the original text, for mapping hits back
+        bounds = [m.start() for m in SENTENCE_SPLIT.finditer(text)]
+        bounds.append(len(text))
+
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            haystack, search, advice_at, variant = lowered, self.scanner.search, self.advice_at.match, 1
+        else:
+            haystack, search, advice_at, variant = text, self.scanner_ci.search, self.advice_at_ci.match, 2
+
+        found_keywords = set()
+        advice_idx = set()
+        sentence = 0
+        m = search(haystack)
+        while m is not None:
+            start = m.start()
+            keyword = m.group("trait")
+            if keyword is not None:
+                if variant == 2:
+                    keyword = self._keyword(keyword)
+                found_keywords.add(keyword)
+                for entry in self.prefix_keywords.get(keyword, ()):
+                    if entry[0] not in found_keywords and entry[variant].match(haystack, start):
+                        found_keywords.add(entry[0])
+            if keyword is None or advice_at(haystack, start):
+                while bounds[sentence] < start:
+                    sentence += 1
+                advice_idx.add(sentence)
+            m = search(haystack, start + 1)
+
+        trait_hits = {}
+        for kw in found_keywords:
+            for trait in self.keyword_traits[kw]:
+                trait_hits[trait] = trait_hits.get(trait, 0) + 1
+        return trait_hits, [sentences[i] for i in sorted(advice_idx)]
+
+    def _keyword(self, matched):
+        """The lexicon keyword a case-insensitive hit stands for (lower() can't always recover it)"""
+        keyword = matched.lower()
+        if keyword in self.keyword_traits:
+            return keyword
+        return next(kw for kw in self.keyword_traits if re.fullmatch(re.escape(kw), matched, re.IGNORECASE))
+
+    def trait_hits(self, text):
+        return self.scan(text)[0]
+
+    def advice_sentences(self, text):
+        return self.scan(text)[1]
+
+
+default_matcher = Matcher()
@@ -0,0 +1,280 @@
+# ======================
+# WRITE-BEHIND AUTOSAVE
+# ======================
+# Autosave hands each exchange's delta to a background thread instead of
+# writing it on the reply path. The writer collects deltas into batches and
+# flushes a batch once it holds MINDLY_SAVE_BATCH deltas or
+# MINDLY_SAVE_FLUSH_INTERVAL seconds after its first one arrived, so every
+# exchange is on disk within a fraction of a second. Consecutive deltas of
+# one conversation in a batch are coalesced into a single append.
+#
+#   - The queue holds at most MINDLY_SAVE_QUEUE deltas. When it is full,
+#     submit() waits up to MINDLY_SAVE_QUEUE_WAIT seconds and then raises
+#     QueueFull, so a stalled disk slows sessions down instead of growing
+#     memory; the caller keeps the delta and retries with the next exchange.
+#   - Failed writes are retried with backoff, in order, up to
+#     MINDLY_SAVE_RETRIES times.
+#   - A conversation whose delta still fails, or is rejected with
+#     safe_io.Conflict (the conversation changed under it), is halted: its
+#     later deltas are dropped, and take_halted() hands the session how many
+#     of its messages reached storage. After a conflict the session saves its
+#     transcript as a new conversation; after a failure it marks the rest
+#     unsaved again and reports the error (see chat_engine).
+#   - close() (registered with atexit) writes everything still queued.
+#
+# Code that reads what a session saved waits for its deltas with drain(),
+# giving up after MINDLY_SAVE_WAIT seconds.
+
+import atexit
+import copy
+import os
+import queue
+import threading
+import time
+
+import metrics
+import safe_io
+
+MAX_PENDING = int(os.environ.get("MINDLY_SAVE_QUEUE", "256"))
+QUEUE_WAIT = float(os.environ.get("MINDLY_SAVE_QUEUE_WAIT", "5"))
+BATCH_SIZE = int(os.environ.get("MINDLY_SAVE_BATCH", "32"))
+FLUSH_INTERVAL = float(os.environ.get("MINDLY_SAVE_FLUSH_INTERVAL", "0.2"))
+SHUTDOWN_WAIT = float(os.environ.get("MINDLY_SAVE_SHUTDOWN_WAIT", "10"))
+SAVE_WAIT = float(os.environ.get("MINDLY_SAVE_WAIT", "10"))
+RETRIES = int(os.environ.get("MINDLY_SAVE_RETRIES", "5"))
+RETRY_BACKOFF_CAP = 5.0
+
+_STOP = object()
+
+
+class QueueFull(Exception):
+    """Too many deltas waiting to be written; save again later"""
+
+
+class SaveTimeout(Exception):
+    """Queued deltas weren't written within the time allowed"""
+
+
+class SaveFailed(Exception):
+    """Queued deltas couldn't be written; they have to be saved again"""
+
+
+class SaveJob:
+    """One conversation delta, as repository.append_delta() takes it"""
+
+    __slots__ = ("repo", "user", "conversation_id", "base", "messages", "traits",
+                 "reactions", "previous_traits", "parts")
+
+    def __init__(self, repo, user, conversation_id, base, messages, traits, reactions=None,
+                 previous_traits=None):
+        self.repo = repo
+        self.user = user
+        self.conversation_id = conversation_id
+        self.base = base
+        self.messages = messages
+        # Snapshots, so the session can keep changing while the job waits
+        self.traits = dict(traits)
+        self.reactions = copy.deepcopy(reactions) if reactions else None
+        self.previous_traits = dict(previous_traits) if previous_traits else None
+        self.parts = 1  # deltas coalesced into this job
+
+    @property
+    def key(self):
+        return (self.user, self.conversation_id)
+
+    def follows(self, other):
+        return self.key == other.key and self.repo is other.repo and \
+            self.base == other.base + len(other.messages)
+
+    def absorb(self, later):
+        """Merge the next delta of the same conversation into this one"""
+        self.messages = self.messages + later.messages
+        self.traits = later.traits
+        self.reactions = later.reactions
+        self.parts += later.parts
+
+
+class WriteBehind:
+    """Background writer for conversation deltas"""
+
+    def __init__(self, max_pending=MAX_PENDING, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(max_pending)
+        self._cond = threading.Condition()
+        # (user, conversation_id) -> [deltas submitted but not written, messages durable so far]
+        self._pending = {}
+        # (user, conversation_id) -> (messages durable, write error or None after a conflict)
+        self._halted = {}
+        self._closed = False
+        self.stats = {"submitted": 0, "written": 0, "batches": 0, "coalesced": 0,
+                      "retries": 0, "conflicts": 0, "failed": 0, "rejected": 0, "last_error": None}
+        self._thread = threading.Thread(target=self._run, name="mindly-write-behind", daemon=True)
+        self._thread.start()
+
+    # ----- callers -----
+    def submit(self, job, timeout=QUEUE_WAIT):
+        """Queue a delta. Raises QueueFull if no room frees up within timeout."""
+        if self._closed:
+            raise RuntimeError("write-behind queue is closed")
+        with self._cond:
+            entry = self._pending.setdefault(job.key, [0, job.base])
+            entry[0] += 1
+        try:
+            self._queue.put(job, timeout=timeout)
+        except queue.Full:
+            self._finished(job, durable=None)
+            self.stats["rejected"] += 1
+            raise QueueFull(f"{self._queue.maxsize} saves already waiting")
+        self.stats["submitted"] += 1
+
+    def durable_count(self, user, conversation_id, default):
+        """Messages of the conversation known to be written (default when none are pending)"""
+        key = (user, conversation_id)
+        with self._cond:
+            if key in self._halted:
+                return self._halted[key][0]
+            entry = self._pending.get(key)
+            return default if entry is None else entry[1]
+
+    def drain(self, user=None, conversation_id=None, timeout=None):
+        """Wait until the matching queued deltas (all, a user's, or one conversation's) are written"""
+        def idle():
+            return not any((user is None or u == user) and (conversation_id is None or c == conversation_id)
+                           for u, c in self._pending)
+        with self._cond:
+            return self._cond.wait_for(idle, timeout)
+
+    def take_halted(self, user, conversation_id, timeout=SAVE_WAIT):
+        """(messages durable, error) once if the conversation was halted, else None.
+
+        error is None when a delta was rejected as stale, else the write
+        error. Waits for the conversation's remaining deltas to be dropped
+        first, so none of them can land after the caller has moved on, and
+        raises SaveTimeout if that takes longer than timeout.
+        """
+        key = (user, conversation_id)
+        with self._cond:
+            if key not in self._halted:
+                return None
+            if not self._cond.wait_for(lambda: key not in self._pending, timeout):
+                raise SaveTimeout(f"earlier saves of conversation {conversation_id} are still being written")
+            return self._halted.pop(key)
+
+    def close(self, timeout=SHUTDOWN_WAIT):
+        """Write everything queued, then stop. Returns False if that took longer than timeout."""
+        if self._closed:
+            return not self._thread.is_alive()
+        self._closed = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return False
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    # ----- writer thread -----
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                return
+            batch, stop = [job], False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    job = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if job is _STOP:
+                    stop = True
+                    break
+                batch.append(job)
+            self._write_batch(batch)
+            if stop:
+                return
+
+    def _write_batch(self, batch):
+        self.stats["batches"] += 1
+        jobs = []
+        for job in batch:
+            # Deltas arrive in order per conversation, so only the latest job of the same conversation can absorb one
+            previous = next((j for j in reversed(jobs) if j.key == job.key), None)
+            if previous is not None and job.follows(previous):
+                previous.absorb(job)
+                self.stats["coalesced"] += 1
+            else:
+                jobs.append(job)
+        metrics.count("autosave_deltas", len(batch), help="Deltas written by the write-behind autosave")
+        for job in jobs:
+            self._write(job)
+
+    def _write(self, job):
+        with self._cond:
+            halted = job.key in self._halted
+        if halted:
+            self._finished(job, durable=None)
+            return
+        attempt = 0
+        while True:
+            try:
+                with metrics.span("save_chat"):
+                    job.repo.append_delta(job.user, job.conversation_id, job.base, job.messages,
+                                          job.traits, job.reactions, previous_traits=job.previous_traits)
+            except safe_io.Conflict:
+                self.stats["conflicts"] += 1
+                self._halt(job, None)
+                return
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                self.stats["last_error"] = error
+                metrics.count("autosave_errors", error=type(e).__name__, help="Failed write-behind autosaves")
+                if attempt == RETRIES:
+                    self.stats["failed"] += 1
+                    self._halt(job, error)
+                    return
+                # Retry in place; order within a conversation must hold
+                self.stats["retries"] += 1
+                time.sleep(min(RETRY_BACKOFF_CAP, 0.1 * 2 ** attempt))
+                attempt += 1
+                continue
+            self.stats["written"] += job.parts
+            self._finished(job, durable=job.base + len(job.messages))
+            return
+
+    def _halt(self, job, error):
+        """Stop writing the job's conversation; later deltas of it are dropped"""
+        with self._cond:
+            entry = self._pending.get(job.key)
+            self._halted[job.key] = (job.base if entry is None else entry[1], error)
+        self._finished(job, durable=None)
+
+    def _finished(self, job, durable):
+        with self._cond:
+            entry = self._pending.get(job.key)
+            if entry is not None:
+                entry[0] -= job.parts
+                if durable is not None:
+                    entry[1] = durable
+                if entry[0] <= 0:
+                    del self._pending[job.key]
+            self._cond.notify_all()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def default_writer():
+    """Process-wide writer, started on first use and flushed at exit"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = WriteBehind()
+                atexit.register(_writer.close)
+    return _writer
+
+def current_writer():
+    """The process-wide writer if one was started, else None"""
+    return _writer